@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import math
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import bindparam, case, delete, exists, extract, func, insert, literal, tuple_, union_all, update
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import dialect_insert, engine
+from .models import (
+    EventOccurrence,
+    EventUserLink,
+    HealthDataType,
+    SportSession,
+    User,
+    UserHealthDaily,
+    UserWeeklyActivity,
+)
+from .settings import settings
+
+# cadence of moderate walking, the WHO goal counts minutes of moderate activity
+STEPS_PER_ACTIVE_MINUTE = 100
+
+# longer participations, e.g. in all-day events, count as one long session
+MAX_EVENT_MINUTES = 180
+
+# sessions are lengthened to multiples of this many minutes
+SESSION_STEP_MINUTES = 5
+
+# format SQLite stores the start of a week in, see rebuild_weekly_activity
+SQLITE_WEEK_FORMAT = "%Y-%m-%d 00:00:00.000000"
+
+
+def week_start(date: datetime) -> datetime:
+    day = date.replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=day.weekday())
+
+
+def occurrence_minutes(start_date: datetime, end_date: datetime) -> float:
+    return min((end_date - start_date).total_seconds() / 60, MAX_EVENT_MINUTES)
+
+
+def session_minutes(missing: float, evenings: int, intensity: int | None) -> int:
+    """
+    Length of the next session when the missing minutes are spread evenly over the remaining evenings of the week
+    """
+    minutes = math.ceil(missing / evenings / SESSION_STEP_MINUTES) * SESSION_STEP_MINUTES
+    return max(settings.activity_session_min_minutes, min(minutes, intensity or settings.activity_session_max_minutes))
+
+
+def _credit_statement():
+    statement = dialect_insert(UserWeeklyActivity)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "week"], set_={"minutes": UserWeeklyActivity.minutes + statement.excluded.minutes}
+    )
+
+
+def _debit_statement():
+    # only existing accumulators are debited, a missing one already counts as zero minutes
+    table = UserWeeklyActivity.__table__
+    minutes = table.c.minutes + bindparam("delta")
+    return (
+        update(table)
+        .where(table.c.user_id == bindparam("debit_user_id"), table.c.week == bindparam("debit_week"))
+        .values(minutes=case((minutes > 0, minutes), else_=0.0))
+    )
+
+
+async def credit_minutes(session: AsyncSession, minutes: dict[tuple[int, datetime], float]):
+    """
+    Add active minutes to the accumulators of the given users and weeks, negative minutes are subtracted down
+    to zero, the caller commits
+    """
+    credits = [
+        {"user_id": user_id, "week": week, "minutes": delta} for (user_id, week), delta in minutes.items() if delta > 0
+    ]
+    debits = [
+        {"debit_user_id": user_id, "debit_week": week, "delta": delta}
+        for (user_id, week), delta in minutes.items()
+        if delta < 0
+    ]
+    if credits:
+        await session.execute(_credit_statement(), credits)
+    if debits:
+        await session.execute(_debit_statement(), debits)
+
+
+async def credit_participation(session: AsyncSession, event_id: int, user_id: int, sign: int = 1):
+    """
+    Add the minutes of the upcoming occurrences of an event to the weeks of a user joining it, or subtract them
+    with sign -1 when the user leaves. Occurrences materialized later are credited by credit_occurrences.
+    """
+    minutes = defaultdict(float)
+    for start_date, end_date in await session.exec(
+        select(EventOccurrence.start_date, EventOccurrence.end_date).where(
+            EventOccurrence.event_id == event_id, EventOccurrence.start_date >= datetime.now()
+        )
+    ):
+        minutes[user_id, week_start(start_date)] += sign * occurrence_minutes(start_date, end_date)
+    await credit_minutes(session, minutes)
+
+
+async def credit_occurrences(session: AsyncSession, occurrences: list[tuple[int, datetime, datetime]]):
+    """
+    Add the minutes of newly materialized (event_id, start_date, end_date) occurrences to the weeks of the
+    participants of their events, the caller commits
+    """
+    participants = defaultdict(list)
+    for event_id, user_id in await session.exec(
+        select(EventUserLink.event_id, EventUserLink.user_id).where(
+            EventUserLink.event_id.in_({event_id for event_id, _, _ in occurrences})
+        )
+    ):
+        participants[event_id].append(user_id)
+
+    minutes = defaultdict(float)
+    for event_id, start_date, end_date in occurrences:
+        for user_id in participants[event_id]:
+            minutes[user_id, week_start(start_date)] += occurrence_minutes(start_date, end_date)
+    await credit_minutes(session, minutes)
+
+
+async def _expire(session: AsyncSession, week: datetime, now: datetime):
+    await session.execute(
+        delete(UserWeeklyActivity).where(
+            UserWeeklyActivity.week < week - timedelta(weeks=settings.activity_retention_weeks)
+        )
+    )
+    # only upcoming sessions are shown, after each sweep the table holds about one night of sessions
+    await session.execute(delete(SportSession).where(SportSession.start_date < now))
+    await session.commit()
+
+
+async def _insert_sessions(
+    session: AsyncSession, rows: list[tuple[float, int, int | None]], end_date: datetime, evenings: int
+):
+    sessions = []
+    for minutes, user_id, intensity in rows:
+        duration = session_minutes(settings.activity_goal_minutes - minutes, evenings, intensity)
+        sessions.append(
+            {"user_id": user_id, "start_date": end_date - timedelta(minutes=duration), "end_date": end_date}
+        )
+    await session.execute(
+        dialect_insert(SportSession).on_conflict_do_nothing(index_elements=["user_id", "start_date"]), sessions
+    )
+    await session.commit()
+
+
+async def plan_sessions(session: AsyncSession, now: datetime | None = None, batch_size: int = 1000) -> int:
+    """
+    Suggest a session for the coming evening to every user below the weekly goal, its length spreads the missing
+    minutes over the remaining evenings. Users without an accumulator in the week have no active minutes yet,
+    they are planned while they have an accumulator within the retention, i.e. were recently active. Of the others
+    only the accumulators below the goal are read, in order of their minutes.
+    Idempotent, so it is safe to run in several workers at once. Returns the number of planned sessions.
+    """
+    now = now or datetime.now()
+    end_date = datetime.combine(now.date(), time(settings.activity_session_end_hour))
+    if end_date <= now:
+        end_date += timedelta(days=1)
+    week = week_start(end_date)
+    evenings = 7 - end_date.weekday()
+    await _expire(session, week, now)
+
+    # reads the recent accumulators instead of the whole user table, dormant users are not planned
+    this_week = UserWeeklyActivity.__table__.alias("this_week")
+    planned, last_user_id = 0, 0
+    while True:
+        rows = (
+            await session.exec(
+                select(literal(0.0), UserWeeklyActivity.user_id, User.intensity)
+                .join(User, User.id == UserWeeklyActivity.user_id)
+                .where(
+                    UserWeeklyActivity.user_id > last_user_id,
+                    UserWeeklyActivity.week >= week - timedelta(weeks=settings.activity_retention_weeks),
+                    UserWeeklyActivity.week < week,
+                    ~exists().where(this_week.c.user_id == UserWeeklyActivity.user_id, this_week.c.week == week),
+                )
+                .group_by(UserWeeklyActivity.user_id, User.intensity)
+                .order_by(UserWeeklyActivity.user_id)
+                .limit(batch_size)
+            )
+        ).all()
+        if not rows:
+            break
+        await _insert_sessions(session, rows, end_date, evenings)
+        planned += len(rows)
+        last_user_id = rows[-1][1]
+
+    after = None
+    while True:
+        query = (
+            select(UserWeeklyActivity.minutes, UserWeeklyActivity.user_id, User.intensity)
+            .join(User, User.id == UserWeeklyActivity.user_id)
+            .where(UserWeeklyActivity.week == week, UserWeeklyActivity.minutes < settings.activity_goal_minutes)
+            .order_by(UserWeeklyActivity.minutes, UserWeeklyActivity.user_id)
+            .limit(batch_size)
+        )
+        if after is not None:
+            query = query.where(tuple_(UserWeeklyActivity.minutes, UserWeeklyActivity.user_id) > tuple_(*after))
+        rows = (await session.exec(query)).all()
+        if not rows:
+            return planned
+        await _insert_sessions(session, rows, end_date, evenings)
+        planned += len(rows)
+        after = rows[-1][:2]
+
+
+async def run_activity_job():
+    """
+    Plan the sessions of the users below the weekly activity goal once a night
+    """
+    while True:
+        now = datetime.now()
+        next_run = datetime.combine(now.date(), time(settings.activity_plan_hour))
+        if next_run <= now:
+            next_run += timedelta(days=1)
+        await asyncio.sleep((next_run - now).total_seconds())
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                planned = await plan_sessions(session)
+            logging.info(f"planned {planned} sport sessions")
+        except Exception:
+            logging.exception("planning sport sessions failed")
+
+
+def rebuild_weekly_activity(connection: Connection, today: date | None = None):
+    """
+    Accumulate the weekly activity of all users within the retention from scratch, for bulk loads that bypass
+    the ingestion and participation routes
+    """
+    week = week_start(datetime.combine(today or date.today(), time()))
+    first_week = week - timedelta(weeks=settings.activity_retention_weeks)
+    duration = EventOccurrence.end_date - EventOccurrence.start_date
+    if connection.dialect.name == "postgresql":
+        sample_week = func.date_trunc("week", UserHealthDaily.start)
+        occurrence_week = func.date_trunc("week", EventOccurrence.start_date)
+        event_minutes = func.least(extract("epoch", duration) / 60, MAX_EVENT_MINUTES)
+    else:
+        # the Sunday ending the week minus six days
+        sample_week = func.strftime(SQLITE_WEEK_FORMAT, UserHealthDaily.start, "weekday 0", "-6 days")
+        occurrence_week = func.strftime(SQLITE_WEEK_FORMAT, EventOccurrence.start_date, "weekday 0", "-6 days")
+        seconds = func.round(
+            (func.julianday(EventOccurrence.end_date) - func.julianday(EventOccurrence.start_date)) * 86400
+        )
+        event_minutes = func.min(seconds / 60, MAX_EVENT_MINUTES)
+
+    minutes = union_all(
+        select(
+            UserHealthDaily.user_id,
+            sample_week.label("week"),
+            (UserHealthDaily.total / float(STEPS_PER_ACTIVE_MINUTE)).label("minutes"),
+        ).where(UserHealthDaily.data_type == HealthDataType.steps, UserHealthDaily.start >= first_week),
+        select(EventUserLink.user_id, occurrence_week, event_minutes)
+        .join(EventOccurrence, EventOccurrence.event_id == EventUserLink.event_id)
+        .where(EventOccurrence.start_date >= first_week),
+    ).subquery()
+
+    connection.execute(delete(UserWeeklyActivity))
+    connection.execute(
+        insert(UserWeeklyActivity).from_select(
+            ["user_id", "week", "minutes"],
+            select(minutes.c.user_id, minutes.c.week, func.sum(minutes.c.minutes)).group_by(
+                minutes.c.user_id, minutes.c.week
+            ),
+        )
+    )
@@ -1,29 +1,45 @@
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, SQLModel
 
-from .database import engine
-from .mock_data_helper import setup_mock_data
+from .activity_helper import run_activity_job
+from .database import engine, read_engine
+from .leaderboard_helper import register_flush_listener, run_leaderboard_job
+from .migration_helper import verify_database_revision
+from .occurrence_helper import run_occurrence_job
+from .pagination_helper import NEXT_CURSOR_HEADER
+from .recommendation_helper import recommendation_index
 from .routers import router as api_router
-
-
-def create_db_and_tables():
-    logging.info("creating database and tables")
-    SQLModel.metadata.create_all(engine)
-
-    with Session(engine) as session:
-        setup_mock_data(session)
+from .search_helper import search_index
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logging.info("lifespan called")
-    create_db_and_tables()
+    started = time.perf_counter()
+    # migrations and mock data are applied by seed.py, so every worker and reload starts without writing
+    await verify_database_revision()
+    register_flush_listener()
+    await run_in_threadpool(search_index.load)
+    background_jobs = [
+        asyncio.create_task(run_occurrence_job()),
+        asyncio.create_task(run_leaderboard_job()),
+        asyncio.create_task(run_activity_job()),
+        asyncio.create_task(search_index.watch()),
+        asyncio.create_task(recommendation_index.watch()),
+    ]
+    logging.info(f"ready after {(time.perf_counter() - started) * 1000:.0f} ms")
     yield
     logging.info("lifespan ending")
+    for job in background_jobs:
+        job.cancel()
+    await engine.dispose()
+    await read_engine.dispose()
 
 
 app = FastAPI(title="LiveMeshBackend", lifespan=lifespan)
@@ -34,6 +50,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
 app.include_router(api_router)
@@ -0,0 +1,53 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*validators) -> str:
+    """
+    Weak ETag derived from cheap validators of a resource, e.g. max(updated_at) and row count
+    """
+    digest = hashlib.blake2b(repr(validators).encode(), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+
+def _strip_weak(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def _as_utc(value: datetime) -> datetime:
+    # naive datetimes are stored in server local time
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def not_modified(
+    request: Request, response: Response, etag: str, last_modified: datetime | None = None
+) -> Response | None:
+    """
+    Set the validators on the response and return a 304 response when the client copy is still current.
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(last_modified), usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        client_etags = {_strip_weak(value) for value in if_none_match.split(",")}
+        if "*" in client_etags or _strip_weak(etag) in client_etags:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and last_modified is not None:
+        try:
+            client_date = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if client_date.tzinfo is not None and _as_utc(last_modified) <= client_date:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return None
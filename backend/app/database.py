@@ -1,11 +1,92 @@
-from sqlmodel import Session, create_engine
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from .settings import settings
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(settings.database_url, connect_args=connect_args)  # echo=True
+# async drivers of the supported databases, URLs that already name a driver are used as they are
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
 
 
-def get_session():
-    with Session(engine) as session:
+def async_database_url(url: str) -> str:
+    scheme, separator, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+
+database_url = async_database_url(settings.database_url)
+pool_options = dict(
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_timeout=settings.database_pool_timeout,
+    pool_recycle=settings.database_pool_recycle,
+    pool_pre_ping=True,
+)
+
+if database_url.startswith("sqlite"):
+    # SQLite allows one writer at a time, so writes queue for a single connection instead of failing with
+    # "database is locked", while WAL lets the read pool run in parallel to it
+    engine = create_async_engine(database_url, **(pool_options | dict(pool_size=1, max_overflow=0)))  # echo=True
+    read_engine = create_async_engine(database_url, **pool_options)
+else:
+    engine = read_engine = create_async_engine(database_url, **pool_options)  # echo=True
+
+
+def _set_sqlite_pragmas(dbapi_connection, query_only: bool):
+    cursor = dbapi_connection.cursor()
+    if not query_only:
+        # persistent in the database file, so setting it on the writer is enough
+        cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute(f"PRAGMA synchronous = {settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA mmap_size = {settings.sqlite_mmap_size}")
+    cursor.execute(f"PRAGMA cache_size = {settings.sqlite_cache_size}")
+    cursor.execute(f"PRAGMA busy_timeout = {settings.sqlite_busy_timeout}")
+    cursor.execute(f"PRAGMA temp_store = {settings.sqlite_temp_store}")
+    cursor.execute(f"PRAGMA query_only = {int(query_only)}")
+    cursor.close()
+
+
+if engine is not read_engine:
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def _connect_writer(dbapi_connection, connection_record):
+        _set_sqlite_pragmas(dbapi_connection, query_only=False)
+        # transactions are started explicitly, see _begin_writer
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin_writer(connection):
+        # take the write lock up front, a deferred transaction that reads first could not upgrade
+        # its snapshot when another process wrote in between
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    @event.listens_for(read_engine.sync_engine, "connect")
+    def _connect_reader(dbapi_connection, connection_record):
+        _set_sqlite_pragmas(dbapi_connection, query_only=True)
+
+
+async def get_session():
+    # objects stay usable after commit, reloading expired attributes lazily is not possible with async IO
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        yield session
+
+
+async def get_read_session():
+    """
+    Session on the read pool, for requests that do not write
+    """
+    async with AsyncSession(read_engine, expire_on_commit=False) as session:
         yield session
+
+
+def dialect_insert(model):
+    """
+    Insert statement of the configured database dialect, supporting on_conflict_do_nothing/on_conflict_do_update
+    """
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
@@ -0,0 +1,131 @@
+import math
+import re
+
+from geopy.geocoders import Nominatim
+from sqlalchemy import func
+from sqlalchemy.sql.elements import ColumnElement
+
+from .cache_helper import TTLCache
+from .settings import settings
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LATITUDE = 111.195
+
+COORDINATES = re.compile(r"\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*")
+
+# size of a grid cell in degrees, about 11 km north-south
+GRID_CELL_DEGREES = 0.1
+GRID_COLUMNS = round(360 / GRID_CELL_DEGREES)
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+
+
+def haversine_km(latitude1: float, longitude1: float, latitude2: float, longitude2: float) -> float:
+    """
+    Great-circle distance between two coordinates in kilometres
+    """
+    phi1, phi2 = math.radians(latitude1), math.radians(latitude2)
+    delta_phi = phi2 - phi1
+    delta_lambda = math.radians(longitude2 - longitude1)
+    a = math.sin(delta_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(delta_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def haversine_km_sql(latitude: float, longitude: float, latitude_column, longitude_column) -> ColumnElement[float]:
+    """
+    haversine_km as SQL expression from a coordinate to coordinate columns, SQLite needs its math functions.
+    Not clamped like haversine_km, which only matters for nearly antipodal coordinates.
+    """
+    phi1, phi2 = math.radians(latitude), func.radians(latitude_column)
+    a = func.power(func.sin((phi2 - phi1) / 2), 2) + math.cos(phi1) * func.cos(phi2) * func.power(
+        func.sin((func.radians(longitude_column) - math.radians(longitude)) / 2), 2
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(a))
+
+
+def _grid_row(latitude: float) -> int:
+    return min(GRID_ROWS - 1, max(0, math.floor((latitude + 90) / GRID_CELL_DEGREES)))
+
+
+def _grid_column(longitude: float) -> int:
+    return math.floor((longitude + 180) / GRID_CELL_DEGREES) % GRID_COLUMNS
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    """
+    Id of the grid cell containing the coordinate, used as coarse spatial index key
+    """
+    return _grid_row(latitude) * GRID_COLUMNS + _grid_column(longitude)
+
+
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> tuple[float, float, float, float]:
+    """
+    (min_latitude, max_latitude, min_longitude, max_longitude) enclosing the circle around the coordinate.
+    The longitude bounds may fall outside [-180, 180] when the circle crosses the antimeridian.
+    """
+    delta_latitude = radius_km / KM_PER_DEGREE_LATITUDE
+    min_latitude = max(-90.0, latitude - delta_latitude)
+    max_latitude = min(90.0, latitude + delta_latitude)
+
+    # the circle is widest at the latitude closest to a pole
+    widest_latitude = max(abs(min_latitude), abs(max_latitude))
+    cos_latitude = math.cos(math.radians(widest_latitude))
+    if cos_latitude * 180 * KM_PER_DEGREE_LATITUDE <= radius_km:
+        return min_latitude, max_latitude, -180.0, 180.0
+
+    delta_longitude = radius_km / (KM_PER_DEGREE_LATITUDE * cos_latitude)
+    return min_latitude, max_latitude, longitude - delta_longitude, longitude + delta_longitude
+
+
+def grid_cell_ranges(latitude: float, longitude: float, radius_km: float) -> list[tuple[int, int]]:
+    """
+    Inclusive ranges of grid cell ids covering the bounding box of the circle around the coordinate,
+    one range per grid row (two where the box crosses the antimeridian), merged where they touch
+    """
+    min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+
+    if max_longitude - min_longitude >= 360 - GRID_CELL_DEGREES:
+        column_ranges = [(0, GRID_COLUMNS - 1)]
+    else:
+        first_column = _grid_column(min_longitude)
+        last_column = _grid_column(max_longitude)
+        if first_column <= last_column:
+            column_ranges = [(first_column, last_column)]
+        else:
+            column_ranges = [(0, last_column), (first_column, GRID_COLUMNS - 1)]
+
+    ranges: list[tuple[int, int]] = []
+    for row in range(_grid_row(min_latitude), _grid_row(max_latitude) + 1):
+        for first_column, last_column in column_ranges:
+            first_cell, last_cell = row * GRID_COLUMNS + first_column, row * GRID_COLUMNS + last_column
+            if ranges and ranges[-1][1] + 1 == first_cell:
+                ranges[-1] = (ranges[-1][0], last_cell)
+            else:
+                ranges.append((first_cell, last_cell))
+    return ranges
+
+
+# geocoded place names, unknown places are cached as none
+geocode_cache: TTLCache[str, tuple[float, float] | None] = TTLCache(
+    settings.geocode_cache_size, settings.geocode_cache_seconds
+)
+
+
+def geocode(location: str) -> tuple[float, float] | None:
+    """
+    Coordinates of a "latitude,longitude" string or a place name, none when the place is unknown.
+    Place names are resolved with Nominatim, blocking (run it in a worker thread) and may raise geopy errors,
+    results are cached in geocode_cache.
+    """
+    if match := COORDINATES.fullmatch(location):
+        latitude, longitude = float(match[1]), float(match[2])
+        if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+            return latitude, longitude
+        return None
+
+    cached, coordinates = geocode_cache.get(location)
+    if cached:
+        return coordinates
+    place = Nominatim(user_agent="LiveMeshBackend", timeout=5).geocode(location)
+    coordinates = (place.latitude, place.longitude) if place else None
+    geocode_cache.put(location, coordinates)
+    return coordinates
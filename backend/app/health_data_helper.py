@@ -0,0 +1,112 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert
+from sqlalchemy.engine import Connection
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .activity_helper import STEPS_PER_ACTIVE_MINUTE, credit_minutes, week_start
+from .database import dialect_insert
+from .models import HealthDataType, User, UserHealthDaily, UserHealthData, UserHealthHourly
+
+# rollup table of each period with the format SQLite stores its start in, see rebuild_health_rollups
+ROLLUPS = {
+    "hour": (UserHealthHourly, "%Y-%m-%d %H:00:00.000000"),
+    "day": (UserHealthDaily, "%Y-%m-%d 00:00:00.000000"),
+}
+
+
+def period_start(date: datetime, period: str) -> datetime:
+    if period == "hour":
+        return date.replace(minute=0, second=0, microsecond=0)
+    return date.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+async def store_samples(
+    session: AsyncSession, user_id: int, samples: dict[tuple[HealthDataType, datetime], int]
+) -> tuple[int, int]:
+    """
+    Insert the new samples of a user, overwrite the changed ones and add the differences to the hourly and daily
+    rollups and the weekly active minutes, all in one transaction. Returns the number of inserted and updated samples.
+    """
+    # ingestions of the same user run one after the other, so the differences are taken from committed values
+    # (SQLite has no row locks, its single writer serializes them anyway)
+    await session.exec(select(User.id).where(User.id == user_id).with_for_update())
+
+    dates = [date for _, date in samples]
+    existing = {
+        (data_type, date): data
+        for data_type, date, data in await session.exec(
+            select(UserHealthData.data_type, UserHealthData.date, UserHealthData.data).where(
+                UserHealthData.user_id == user_id,
+                UserHealthData.data_type.in_({data_type for data_type, _ in samples}),
+                UserHealthData.date.between(min(dates), max(dates)),
+            )
+        )
+    }
+
+    rows = []
+    rollups = {period: defaultdict(lambda: [0, 0]) for period in ROLLUPS}
+    active_minutes = defaultdict(float)
+    inserted = 0
+    for (data_type, date), data in samples.items():
+        old_data = existing.get((data_type, date))
+        if old_data == data:
+            continue
+        inserted += old_data is None
+        rows.append({"user_id": user_id, "data_type": data_type, "date": date, "data": data})
+        for period, totals in rollups.items():
+            total = totals[data_type, period_start(date, period)]
+            total[0] += data - (old_data or 0)
+            total[1] += old_data is None
+        if data_type == HealthDataType.steps:
+            active_minutes[user_id, week_start(date)] += (data - (old_data or 0)) / STEPS_PER_ACTIVE_MINUTE
+
+    if rows:
+        statement = dialect_insert(UserHealthData)
+        await session.execute(
+            statement.on_conflict_do_update(
+                index_elements=["user_id", "data_type", "date"], set_={"data": statement.excluded.data}
+            ),
+            rows,
+        )
+        for period, totals in rollups.items():
+            model, _ = ROLLUPS[period]
+            statement = dialect_insert(model)
+            await session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["user_id", "data_type", "start"],
+                    set_={
+                        "total": model.total + statement.excluded.total,
+                        "sample_count": model.sample_count + statement.excluded.sample_count,
+                    },
+                ),
+                [
+                    {"user_id": user_id, "data_type": data_type, "start": start, "total": total, "sample_count": count}
+                    for (data_type, start), (total, count) in totals.items()
+                ],
+            )
+        await credit_minutes(session, active_minutes)
+    await session.commit()
+    return inserted, len(rows) - inserted
+
+
+def rebuild_health_rollups(connection: Connection):
+    """
+    Aggregate the hourly and daily rollups of all samples from scratch, for bulk loads that bypass store_samples
+    """
+    for period, (model, sqlite_format) in ROLLUPS.items():
+        if connection.dialect.name == "postgresql":
+            start = func.date_trunc(period, UserHealthData.date)
+        else:
+            start = func.strftime(sqlite_format, UserHealthData.date)
+        connection.execute(delete(model))
+        connection.execute(
+            insert(model).from_select(
+                ["user_id", "data_type", "start", "total", "sample_count"],
+                select(
+                    UserHealthData.user_id, UserHealthData.data_type, start, func.sum(UserHealthData.data), func.count()
+                ).group_by(UserHealthData.user_id, UserHealthData.data_type, start),
+            )
+        )
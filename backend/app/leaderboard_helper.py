@@ -0,0 +1,402 @@
+import asyncio
+import logging
+import math
+from collections import Counter, defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from enum import Enum
+from itertools import batched, chain
+
+from sqlalchemy import Integer, String, and_, case, cast, delete, event, func, insert, inspect, literal, or_, tuple_
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import dialect_insert, engine
+from .models import LeaderboardBucket, LeaderboardEntry, User, UserTagLink
+from .settings import settings
+
+# buckets per level, a rank counts the users of its own bucket one by one and sums the buckets above
+LEVEL_BUCKETS = 100
+
+# birthdays are checked this many days back, so age bands are still moved after the job did not run for a while
+AGE_BAND_GRACE_DAYS = 7
+
+
+class AgeBand(str, Enum):
+    under_18 = "under-18"
+    from_18 = "18-29"
+    from_30 = "30-39"
+    from_40 = "40-49"
+    from_50 = "50-59"
+    from_60 = "60-plus"
+
+
+# age at which each band starts, oldest first
+AGE_BAND_STARTS = [
+    (60, AgeBand.from_60),
+    (50, AgeBand.from_50),
+    (40, AgeBand.from_40),
+    (30, AgeBand.from_30),
+    (18, AgeBand.from_18),
+    (0, AgeBand.under_18),
+]
+
+
+def level_bucket(level: float) -> int:
+    return math.floor(level * LEVEL_BUCKETS)
+
+
+def _bucket_expression(connection: Connection, level):
+    # levels are not negative, so truncating like SQLite's cast does is the same as math.floor
+    if connection.dialect.name == "postgresql":
+        return cast(func.floor(level * LEVEL_BUCKETS), Integer)
+    return cast(level * LEVEL_BUCKETS, Integer)
+
+
+def _years_before(day: date, years: int) -> date:
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # 29th of February
+        return day.replace(year=day.year - years, day=28)
+
+
+def age_band(birthday: datetime | None, today: date) -> AgeBand | None:
+    if birthday is None:
+        return None
+    for start, band in AGE_BAND_STARTS:
+        if birthday.date() <= _years_before(today, start):
+            return band
+    return AgeBand.under_18
+
+
+def leaderboard_scope(tag_id: int | None = None, band: AgeBand | None = None) -> str:
+    parts = []
+    if tag_id is not None:
+        parts.append(f"tag:{tag_id}")
+    if band is not None:
+        parts.append(f"age:{band.value}")
+    return ":".join(parts) or "all"
+
+
+def user_scopes(tag_ids: Iterable[int], band: AgeBand | None) -> list[str]:
+    tag_ids = [None, *tag_ids]
+    bands = [None] if band is None else [None, band]
+    return [leaderboard_scope(tag_id, band) for tag_id in tag_ids for band in bands]
+
+
+def _update_buckets(connection: Connection, deltas: Counter):
+    # buckets without a delta are still touched, their users were moved within them or their tags changed
+    now = datetime.now()
+    changes = [
+        {"scope": scope, "bucket": bucket, "user_count": delta, "updated_at": now}
+        for (scope, bucket), delta in deltas.items()
+    ]
+    if changes:
+        statement = dialect_insert(LeaderboardBucket)
+        connection.execute(
+            statement.on_conflict_do_update(
+                index_elements=["scope", "bucket"],
+                set_={
+                    "user_count": LeaderboardBucket.user_count + statement.excluded.user_count,
+                    "updated_at": statement.excluded.updated_at,
+                },
+            ),
+            changes,
+        )
+
+
+def sync_leaderboard(connection: Connection, user_ids: Iterable[int], today: date | None = None) -> int:
+    """
+    Bring the leaderboard entries of the given users in line with their level, age band and tags,
+    only the entries that differ are written. Returns the number of changed entries.
+    """
+    today = today or date.today()
+    changed = 0
+    for batch in batched(sorted(set(user_ids)), 500):
+        tag_ids = defaultdict(list)
+        for user_id, tag_id in connection.execute(
+            select(UserTagLink.user_id, UserTagLink.tag_id).where(UserTagLink.user_id.in_(batch))
+        ):
+            tag_ids[user_id].append(tag_id)
+        wanted = {
+            (user_id, scope): (level_bucket(level), level)
+            for user_id, level, birthday in connection.execute(
+                select(User.id, User.level, User.birthday).where(User.id.in_(batch))
+            )
+            for scope in user_scopes(tag_ids[user_id], age_band(birthday, today))
+        }
+        existing = {
+            (user_id, scope): (entry_id, bucket, level)
+            for entry_id, user_id, scope, bucket, level in connection.execute(
+                select(
+                    LeaderboardEntry.id,
+                    LeaderboardEntry.user_id,
+                    LeaderboardEntry.scope,
+                    LeaderboardEntry.bucket,
+                    LeaderboardEntry.level,
+                ).where(LeaderboardEntry.user_id.in_(batch))
+            )
+        }
+
+        deltas = Counter()
+        stale, changed_users = [], set()
+        for (user_id, scope), (entry_id, bucket, level) in existing.items():
+            if wanted.get((user_id, scope)) != (bucket, level):
+                stale.append(entry_id)
+                changed_users.add(user_id)
+                deltas[scope, bucket] -= 1
+        fresh = []
+        for (user_id, scope), (bucket, level) in wanted.items():
+            if (user_id, scope) in existing and existing[user_id, scope][1:] == (bucket, level):
+                continue
+            fresh.append({"scope": scope, "bucket": bucket, "level": level, "user_id": user_id})
+            changed_users.add(user_id)
+            deltas[scope, bucket] += 1
+        # pages show the tags of their users, so a changed user touches the buckets of all of its leaderboards
+        for (user_id, scope), (_, bucket, _) in existing.items():
+            if user_id in changed_users:
+                deltas[scope, bucket] += 0
+
+        if stale:
+            connection.execute(delete(LeaderboardEntry).where(LeaderboardEntry.id.in_(stale)))
+        if fresh:
+            connection.execute(insert(LeaderboardEntry), fresh)
+        _update_buckets(connection, deltas)
+        changed += len(stale) + len(fresh)
+    return changed
+
+
+def rebuild_leaderboard(connection: Connection, today: date | None = None):
+    """
+    Materialize the leaderboards of all users from scratch, for bulk loads that bypass the ORM
+    """
+    today = today or date.today()
+    connection.execute(delete(LeaderboardEntry))
+    connection.execute(delete(LeaderboardBucket))
+
+    # a user is in the band of the first start age the birthday is not after, like age_band
+    band = case(
+        *(
+            (User.birthday < datetime.combine(_years_before(today, start) + timedelta(days=1), time()), name.value)
+            for start, name in AGE_BAND_STARTS[:-1]
+        ),
+        else_=AgeBand.under_18.value,
+    )
+    bucket = _bucket_expression(connection, User.level)
+    tag_scope = literal("tag:") + cast(UserTagLink.tag_id, String)
+    columns = ["scope", "bucket", "level", "user_id"]
+    scopes = [
+        select(literal("all"), bucket, User.level, User.id),
+        select(literal("age:") + band, bucket, User.level, User.id).where(User.birthday.is_not(None)),
+        select(tag_scope, bucket, User.level, User.id).join(UserTagLink, UserTagLink.user_id == User.id).distinct(),
+        select(tag_scope + literal(":age:") + band, bucket, User.level, User.id)
+        .join(UserTagLink, UserTagLink.user_id == User.id)
+        .where(User.birthday.is_not(None))
+        .distinct(),
+    ]
+    for scope in scopes:
+        connection.execute(insert(LeaderboardEntry).from_select(columns, scope))
+
+    connection.execute(
+        insert(LeaderboardBucket).from_select(
+            ["scope", "bucket", "user_count", "updated_at"],
+            select(LeaderboardEntry.scope, LeaderboardEntry.bucket, func.count(), literal(datetime.now())).group_by(
+                LeaderboardEntry.scope, LeaderboardEntry.bucket
+            ),
+        )
+    )
+
+
+def update_age_bands(connection: Connection, today: date | None = None) -> int:
+    """
+    Move the users whose age band changed recently, only their birthdays are looked up instead of all users
+    """
+    today = today or date.today()
+    ranges = []
+    for start, _ in AGE_BAND_STARTS[:-1]:
+        # users born on this day or before have reached the start age
+        birthdays_until = datetime.combine(_years_before(today, start) + timedelta(days=1), time())
+        birthdays_from = birthdays_until - timedelta(days=AGE_BAND_GRACE_DAYS + 1)
+        ranges.append(and_(User.birthday >= birthdays_from, User.birthday < birthdays_until))
+    user_ids = connection.execute(select(User.id).where(or_(*ranges))).scalars().all()
+    return sync_leaderboard(connection, user_ids, today)
+
+
+async def run_leaderboard_job():
+    """
+    Keep the age band leaderboards current as users get older
+    """
+    while True:
+        try:
+            async with engine.begin() as connection:
+                changed = await connection.run_sync(update_age_bands)
+            logging.info(f"moved {changed} leaderboard entries between age bands")
+        except Exception:
+            logging.exception("updating the age band leaderboards failed")
+        await asyncio.sleep(settings.leaderboard_refresh_seconds)
+
+
+def _sync_flushed_users(session: Session, flush_context):
+    user_ids = set()
+    for instance in chain(session.new, session.dirty, session.deleted):
+        if isinstance(instance, UserTagLink):
+            user_ids.add(instance.user_id)
+        elif isinstance(instance, User):
+            state = inspect(instance)
+            if instance not in session.dirty or any(
+                state.attrs[name].history.has_changes() for name in ("level", "birthday")
+            ):
+                user_ids.add(instance.id)
+    if user_ids:
+        sync_leaderboard(session.connection(), user_ids)
+
+
+def register_flush_listener():
+    """
+    Synchronize the leaderboards in the flush of every session, so all ORM writes of levels, birthdays and tags
+    update them. Called once by each process writing users, i.e. the API and seed.py.
+    """
+    if not event.contains(Session, "after_flush", _sync_flushed_users):
+        event.listen(Session, "after_flush", _sync_flushed_users)
+
+
+@dataclass(slots=True)
+class RankedEntry:
+    position: int  # zero based, users with the same level have different positions
+    rank: int
+    bucket: int
+    user_id: int
+    level: float
+    email: str
+    username: str
+
+
+def _ranked(rows: list, first_position: int, first_rank: int) -> list[RankedEntry]:
+    # users with the same level share a rank, a user below a higher level is ranked by its position
+    ranked = []
+    for index, (bucket, level, user_id, email, username) in enumerate(rows):
+        if index == 0:
+            rank = first_rank
+        elif level == ranked[-1].level:
+            rank = ranked[-1].rank
+        else:
+            rank = first_position + index + 1
+        ranked.append(RankedEntry(first_position + index, rank, bucket, user_id, level, email, username))
+    return ranked
+
+
+def _entries(scope: str):
+    return (
+        select(LeaderboardEntry.bucket, LeaderboardEntry.level, LeaderboardEntry.user_id, User.email, User.username)
+        .join(User, User.id == LeaderboardEntry.user_id)
+        .where(LeaderboardEntry.scope == scope)
+    )
+
+
+_DESCENDING = (LeaderboardEntry.bucket.desc(), LeaderboardEntry.level.desc(), LeaderboardEntry.user_id.desc())
+_ASCENDING = (LeaderboardEntry.bucket, LeaderboardEntry.level, LeaderboardEntry.user_id)
+
+
+async def _users_above(session: AsyncSession, scope: str, bucket: int, level: float, user_id: int | None) -> int:
+    """
+    Number of users ranked before the given level, or before the given entry when user_id is set
+    """
+    in_bucket = LeaderboardEntry.level > level
+    if user_id is not None:
+        in_bucket = tuple_(LeaderboardEntry.level, LeaderboardEntry.user_id) > tuple_(level, user_id)
+    above = (
+        await session.exec(
+            select(
+                select(func.coalesce(func.sum(LeaderboardBucket.user_count), 0))
+                .where(LeaderboardBucket.scope == scope, LeaderboardBucket.bucket > bucket)
+                .scalar_subquery(),
+                select(func.count())
+                .select_from(LeaderboardEntry)
+                .where(LeaderboardEntry.scope == scope, LeaderboardEntry.bucket == bucket, in_bucket)
+                .scalar_subquery(),
+            )
+        )
+    ).one()
+    return sum(above)
+
+
+async def leaderboard_version(session: AsyncSession, scope: str) -> tuple[datetime | None, int | None]:
+    """
+    Last change and number of users of a leaderboard, read from its buckets without touching the entries
+    """
+    return (
+        await session.exec(
+            select(func.max(LeaderboardBucket.updated_at), func.sum(LeaderboardBucket.user_count)).where(
+                LeaderboardBucket.scope == scope
+            )
+        )
+    ).one()
+
+
+async def leaderboard_page(
+    session: AsyncSession, scope: str, offset: int, limit: int, after: tuple[int, float, int, int] | None = None
+) -> list[RankedEntry]:
+    """
+    Users of a leaderboard from offset on, or after the (bucket, level, user_id, position) of the last row of the
+    previous page. An offset skips whole buckets by their counts, so neither variant counts or sorts the users above.
+    """
+    query = _entries(scope)
+    if after is not None:
+        bucket, level, user_id, position = after
+        query = query.where(tuple_(*_ASCENDING) < tuple_(bucket, level, user_id)).limit(limit)
+        first_position = position + 1
+    elif offset:
+        buckets = await session.exec(
+            select(LeaderboardBucket.bucket, LeaderboardBucket.user_count)
+            .where(LeaderboardBucket.scope == scope, LeaderboardBucket.user_count > 0)
+            .order_by(LeaderboardBucket.bucket.desc())
+        )
+        skipped = 0
+        for bucket, user_count in buckets:
+            if skipped + user_count > offset:
+                break
+            skipped += user_count
+        else:
+            return []
+        query = query.where(LeaderboardEntry.bucket <= bucket).offset(offset - skipped).limit(limit)
+        first_position = offset
+    else:
+        query = query.limit(limit)
+        first_position = 0
+
+    rows = (await session.exec(query.order_by(*_DESCENDING))).all()
+    if not rows:
+        return []
+    first_rank = 1 + await _users_above(session, scope, rows[0][0], rows[0][1], None)
+    return _ranked(rows, first_position, first_rank)
+
+
+async def leaderboard_neighbours(
+    session: AsyncSession, scope: str, user_id: int, count: int
+) -> list[RankedEntry] | None:
+    """
+    The given user with up to count users ranked directly before and after, none when the user is not on the
+    leaderboard
+    """
+    own = (
+        await session.exec(
+            select(LeaderboardEntry.bucket, LeaderboardEntry.level).where(
+                LeaderboardEntry.user_id == user_id, LeaderboardEntry.scope == scope
+            )
+        )
+    ).first()
+    if own is None:
+        return None
+    key = tuple_(*_ASCENDING)
+    own_key = tuple_(own.bucket, own.level, user_id)
+
+    before = (await session.exec(_entries(scope).where(key > own_key).order_by(*_ASCENDING).limit(count))).all()
+    rest = (await session.exec(_entries(scope).where(key <= own_key).order_by(*_DESCENDING).limit(count + 1))).all()
+    rows = [*reversed(before), *rest]
+
+    position = await _users_above(session, scope, own.bucket, own.level, user_id)
+    first_rank = 1 + await _users_above(session, scope, rows[0][0], rows[0][1], None)
+    return _ranked(rows, position - len(before), first_rank)
@@ -0,0 +1,158 @@
+import logging
+import os
+
+from alembic import command
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection
+
+from .database import engine, read_engine
+
+ALEMBIC_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+# tables, columns ("table.column") and indexes ("table:index") each revision adds, in revision order,
+# a database created by SQLModel.metadata.create_all is stamped with the last revision whose schema it has
+REVISION_SCHEMAS = {
+    "0001": {"event", "user", "tag", "eventuserlink", "eventtaglink", "usertaglink"},
+    "0002": {
+        "eventoccurrence",
+        "eventoccurrence:ix_eventoccurrence_event_id_start_date",
+        "eventoccurrence:ix_eventoccurrence_start_date_id",
+        "event.recurrence",
+        "event.recurrence_until",
+        "event.participant_count",
+        "event.geo_cell",
+        "event:ix_event_geo_cell",
+        "event:ix_event_recurrence",
+        "event:ix_event_start_date_id",
+        "event:ix_event_updated_at",
+        "eventuserlink:ix_eventuserlink_event_id_user_id",
+        "user:ix_user_email",
+    },
+    "0003": {
+        "userhealthdata",
+        "userhealthdata:ix_userhealthdata_user_id_data_type_date",
+        "eventtaglink:ix_eventtaglink_event_id_tag_id",
+        "eventtaglink:ix_eventtaglink_tag_id_event_id",
+        "eventuserlink:ix_eventuserlink_user_id_event_id",
+        "tag:ix_tag_name",
+        "user:ix_user_level",
+        "usertaglink:ix_usertaglink_tag_id_user_id",
+        "usertaglink:ix_usertaglink_user_id_tag_id",
+    },
+    "0004": {
+        "leaderboardbucket",
+        "leaderboardbucket:ix_leaderboardbucket_scope_bucket",
+        "leaderboardentry",
+        "leaderboardentry:ix_leaderboardentry_scope_bucket_level_user_id",
+        "leaderboardentry:ix_leaderboardentry_user_id_scope",
+        "user:ix_user_birthday",
+    },
+    "0005": {
+        "userhealthdaily",
+        "userhealthdaily:ix_userhealthdaily_user_id_data_type_start",
+        "userhealthhourly",
+        "userhealthhourly:ix_userhealthhourly_user_id_data_type_start",
+        "userhealthdata:ix_userhealthdata_user_id_data_type_date unique",
+    },
+    "0006": {
+        "sportsession",
+        "sportsession:ix_sportsession_user_id_start_date",
+        "userweeklyactivity",
+        "userweeklyactivity:ix_userweeklyactivity_user_id_week",
+        "userweeklyactivity:ix_userweeklyactivity_week_minutes_user_id",
+    },
+    "0007": {"leaderboardbucket.updated_at"},
+}
+# keyword search table and triggers of revision 0002, only created on SQLite
+SQLITE_REVISION_SCHEMAS = {"0002": {"event_fts"}}
+
+
+def alembic_config(connection: Connection | None = None) -> Config:
+    """
+    Alembic configuration of the backend, migrations run on the given connection instead of a new engine
+    """
+    config = Config(ALEMBIC_CONFIG_PATH)
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def _schema(connection: Connection) -> set[str]:
+    """
+    Tables, columns and indexes of the database named like in REVISION_SCHEMAS
+    """
+    inspector = inspect(connection)
+    schema = set()
+    for table in inspector.get_table_names():
+        schema.add(table)
+        schema.update(f"{table}.{column['name']}" for column in inspector.get_columns(table))
+        for index in inspector.get_indexes(table):
+            schema.add(f"{table}:{index['name']}")
+            if index["unique"]:
+                schema.add(f"{table}:{index['name']} unique")
+    return schema
+
+
+def _created_revision(connection: Connection) -> str | None:
+    """
+    Revision of a database created by create_all without migrations, none when it is empty or migrated.
+    Fails when its schema is not exactly the one of a revision, e.g. half of the changes of a revision
+    were created, as stamping it with a guess would skip or repeat migrations.
+    """
+    inspector = inspect(connection)
+    if inspector.has_table("alembic_version") or not inspector.has_table("event"):
+        return None
+    schema = _schema(connection)
+    created_revision = None
+    for previous_revision, (revision, objects) in zip([None, *REVISION_SCHEMAS], REVISION_SCHEMAS.items()):
+        if connection.dialect.name == "sqlite":
+            objects = objects | SQLITE_REVISION_SCHEMAS.get(revision, set())
+        missing = objects - schema
+        if not missing and created_revision == previous_revision:
+            created_revision = revision
+        elif len(missing) < len(objects):
+            raise RuntimeError(
+                f"database was created without migrations and its schema matches no revision, revision {revision} "
+                f"is missing {sorted(missing)}, inspect it and mark it with alembic stamp <revision> by hand"
+            )
+    if created_revision is None:
+        raise RuntimeError(
+            "database was created without migrations and its schema matches no revision, "
+            "inspect it and mark it with alembic stamp <revision> by hand"
+        )
+    return created_revision
+
+
+def _upgrade(connection: Connection, revision: str):
+    config = alembic_config(connection)
+    if created_revision := _created_revision(connection):
+        logging.info(f"database was created without migrations, marking it as revision {created_revision}")
+        command.stamp(config, created_revision)
+    command.upgrade(config, revision)
+
+
+async def upgrade_database(revision: str = "head"):
+    """
+    Migrate the database schema to the given revision. The writer lock is held for the whole upgrade,
+    so workers starting at the same time migrate one after the other.
+    """
+    async with engine.begin() as connection:
+        await connection.run_sync(_upgrade, revision)
+
+
+def _current_revision(connection: Connection) -> str | None:
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+async def verify_database_revision():
+    """
+    Fail when the database is not migrated to the latest revision, the API does not migrate it by itself
+    """
+    head = ScriptDirectory.from_config(alembic_config()).get_current_head()
+    async with read_engine.connect() as connection:
+        revision = await connection.run_sync(_current_revision)
+    if revision != head:
+        raise RuntimeError(f"database is at revision {revision} instead of {head}, migrate it with seed.py")
@@ -2,8 +2,10 @@ from datetime import datetime
 from enum import Enum
 
 from pydantic import BaseModel
+from sqlalchemy import Index, event
 from sqlmodel import Field, Relationship, SQLModel
 
+from ..geo_helper import grid_cell
 from .EventTagLink import EventTagLink
 from .EventUserLink import EventUserLink
 
@@ -16,6 +18,10 @@ class EventOrganiserType(str, Enum):
     advertisement = "advertisement"
 
 
+class EventRecurrence(str, Enum):
+    weekly = "weekly"
+
+
 class EventDTO(BaseModel):
     name: str
     description: str
@@ -28,15 +34,38 @@ class EventDTO(BaseModel):
     max_participants: int | None = None  # when none than unlimited
     bonus_points: int = 0
 
-    start_date: datetime
+    start_date: datetime  # first occurrence when recurring
     end_date: datetime
 
+    recurrence: EventRecurrence | None = None  # when none than it happens once
+    recurrence_until: datetime | None = None  # when none than it recurs forever
+
 
 class Event(SQLModel, EventDTO, table=True):
+    __table_args__ = (
+        # upcoming-event listings filter and page on (start_date, id)
+        Index("ix_event_start_date_id", "start_date", "id"),
+        # max(updated_at) is the validator for conditional requests of the event list
+        Index("ix_event_updated_at", "updated_at"),
+        # covers the coarse prune of radius queries without touching the table
+        Index("ix_event_geo_cell", "geo_cell", "latitude", "longitude", "start_date"),
+        # the occurrence job only visits recurring events
+        Index("ix_event_recurrence", "recurrence", "recurrence_until"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
 
     created_at: datetime
     updated_at: datetime
 
+    participant_count: int = Field(default=0, description="Number of EventUserLink rows, kept in sync on write")
+    geo_cell: int | None = Field(default=None, description="Grid cell of the coordinates, see geo_helper")
+
     tags: list["Tag"] = Relationship(back_populates="events", link_model=EventTagLink)  # noqa: F821
     attendees: list["User"] = Relationship(back_populates="events", link_model=EventUserLink)  # noqa: F821
+
+
+@event.listens_for(Event, "before_insert")
+@event.listens_for(Event, "before_update")
+def _update_geo_cell(mapper, connection, target: Event):
+    target.geo_cell = grid_cell(target.latitude, target.longitude)
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class EventOccurrence(SQLModel, table=True):
+    """
+    Materialized occurrence of an event, recurring events have one row per occurrence up to a rolling horizon
+    """
+
+    __table_args__ = (
+        # calendar and range queries scan occurrences by start date
+        Index("ix_eventoccurrence_start_date_id", "start_date", "id"),
+        # an occurrence is materialized only once, also used to find the last materialized occurrence
+        Index("ix_eventoccurrence_event_id_start_date", "event_id", "start_date", unique=True),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    start_date: datetime
+    end_date: datetime
+
+    event_id: int = Field(foreign_key="event.id")
@@ -1,7 +1,15 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class EventTagLink(SQLModel, table=True):
+    __table_args__ = (
+        # tags of events, covering so the tag ids are read from the index
+        Index("ix_eventtaglink_event_id_tag_id", "event_id", "tag_id"),
+        # events of a tag for the tag filters
+        Index("ix_eventtaglink_tag_id_event_id", "tag_id", "event_id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
 
     event_id: int = Field(foreign_key="event.id")
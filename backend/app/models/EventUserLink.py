@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -13,6 +14,13 @@ class EventParticipationType(str, Enum):
 
 
 class EventUserLink(SQLModel, table=True):
+    __table_args__ = (
+        # a user can participate in an event only once
+        Index("ix_eventuserlink_event_id_user_id", "event_id", "user_id", unique=True),
+        # events of a user
+        Index("ix_eventuserlink_user_id_event_id", "user_id", "event_id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     participation_type: EventParticipationType
     date: datetime | None
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class LeaderboardBucket(SQLModel, table=True):
+    """
+    Number of users per level bucket of a leaderboard, a rank sums the buckets above instead of counting users
+    """
+
+    # the buckets of a scope are read in level order and updated by key
+    __table_args__ = (Index("ix_leaderboardbucket_scope_bucket", "scope", "bucket", unique=True),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    scope: str
+    bucket: int
+    user_count: int
+    updated_at: datetime = Field(
+        description="Last change of an entry in the bucket or of the tags of its users, validator of leaderboard pages"
+    )
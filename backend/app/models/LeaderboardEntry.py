@@ -0,0 +1,24 @@
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class LeaderboardEntry(SQLModel, table=True):
+    """
+    Materialized position of a user on one leaderboard (scope), maintained by leaderboard_helper.
+    Every user is on the leaderboard of all users, of each of their tags, of their age band and of each tag
+    within their age band.
+    """
+
+    __table_args__ = (
+        # leaderboard pages and ranks walk a scope in level order without sorting
+        Index("ix_leaderboardentry_scope_bucket_level_user_id", "scope", "bucket", "level", "user_id", unique=True),
+        # the entries of a user are synchronized when the level, birthday or tags change
+        Index("ix_leaderboardentry_user_id_scope", "user_id", "scope", unique=True),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    scope: str = Field(description='"all", "tag:<id>", "age:<band>" or "tag:<id>:age:<band>"')
+    bucket: int = Field(description="Level bucket, see leaderboard_helper.level_bucket")
+    level: float
+
+    user_id: int = Field(foreign_key="user.id")
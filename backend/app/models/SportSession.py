@@ -0,0 +1,21 @@
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class SportSessionDTO(SQLModel):
+    """
+    Sport session suggested to a user who has not reached the weekly activity goal yet
+    """
+
+    start_date: datetime
+    end_date: datetime
+
+
+class SportSession(SportSessionDTO, table=True):
+    # at most one session per user and start, upcoming sessions are read per user
+    __table_args__ = (Index("ix_sportsession_user_id_start_date", "user_id", "start_date", unique=True),)
+
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 
 from .EventTagLink import EventTagLink
@@ -5,6 +6,9 @@ from .UserTagLink import UserTagLink
 
 
 class Tag(SQLModel, table=True):
+    # tags are looked up by name when filtering, registering and importing
+    __table_args__ = (Index("ix_tag_name", "name"),)
+
     id: int | None = Field(default=None, primary_key=True)
     name: str
     emoji: str | None = Field(default=None, description="Emoji to display with the tag")
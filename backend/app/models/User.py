@@ -1,6 +1,7 @@
 from datetime import datetime
 
 from pydantic import BaseModel
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 
 from .EventUserLink import EventUserLink
@@ -28,6 +29,15 @@ class UserDTO(UserPublicDTO):
 
 
 class User(SQLModel, UserDTO, table=True):
+    __table_args__ = (
+        # every authenticated request and login looks the user up by email
+        Index("ix_user_email", "email", unique=True),
+        # the leaderboard is ordered by level
+        Index("ix_user_level", "level"),
+        # the leaderboard job finds the users changing their age band by birthday
+        Index("ix_user_birthday", "birthday"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
     hashed_password: str
 
@@ -1,6 +1,7 @@
 from datetime import datetime
 from enum import Enum
 
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
@@ -11,6 +12,9 @@ class HealthDataType(str, Enum):
 
 
 class UserHealthData(SQLModel, table=True):
+    # a sample is stored once per user, type and date, read per user and type over a date range
+    __table_args__ = (Index("ix_userhealthdata_user_id_data_type_date", "user_id", "data_type", "date", unique=True),)
+
     id: int | None = Field(default=None, primary_key=True)
 
     data_type: HealthDataType
@@ -0,0 +1,37 @@
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+from .UserHealthData import HealthDataType
+
+
+class UserHealthRollupDTO(SQLModel):
+    """
+    Sum of the health data samples of one type in a period, maintained on ingestion by health_data_helper
+    """
+
+    data_type: HealthDataType
+    start: datetime = Field(description="Start of the hour or day")
+    total: int
+    sample_count: int
+
+
+class UserHealthHourly(UserHealthRollupDTO, table=True):
+    # one row per user, type and hour, read per user and type over a date range
+    __table_args__ = (
+        Index("ix_userhealthhourly_user_id_data_type_start", "user_id", "data_type", "start", unique=True),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+
+
+class UserHealthDaily(UserHealthRollupDTO, table=True):
+    # one row per user, type and day, read per user and type over a date range
+    __table_args__ = (
+        Index("ix_userhealthdaily_user_id_data_type_start", "user_id", "data_type", "start", unique=True),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
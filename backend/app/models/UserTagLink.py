@@ -1,7 +1,15 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 
 class UserTagLink(SQLModel, table=True):
+    __table_args__ = (
+        # tags of users, covering so the tag ids are read from the index
+        Index("ix_usertaglink_user_id_tag_id", "user_id", "tag_id"),
+        # users of a tag, also needed to delete tags without scanning the links
+        Index("ix_usertaglink_tag_id_user_id", "tag_id", "user_id"),
+    )
+
     id: int | None = Field(default=None, primary_key=True)
 
     user_id: int = Field(foreign_key="user.id")
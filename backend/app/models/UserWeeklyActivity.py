@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import Index
+from sqlmodel import Field, SQLModel
+
+
+class UserWeeklyActivity(SQLModel, table=True):
+    """
+    Active minutes of a user in a week, accumulated from health samples and participations by activity_helper
+    """
+
+    __table_args__ = (
+        # one accumulator per user and week
+        Index("ix_userweeklyactivity_user_id_week", "user_id", "week", unique=True),
+        # the scheduler reads the users below the goal of a week in order of their minutes
+        Index("ix_userweeklyactivity_week_minutes_user_id", "week", "minutes", "user_id"),
+    )
+
+    id: int | None = Field(default=None, primary_key=True)
+    week: datetime = Field(description="Monday 00:00 of the week")
+    minutes: float = 0
+
+    user_id: int = Field(foreign_key="user.id")
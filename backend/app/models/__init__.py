@@ -1,7 +1,14 @@
-from .Event import Event, EventDTO, EventOrganiserType  # noqa: F401
+from .Event import Event, EventDTO, EventOrganiserType, EventRecurrence  # noqa: F401
+from .EventOccurrence import EventOccurrence  # noqa: F401
 from .EventTagLink import EventTagLink  # noqa: F401
 from .EventUserLink import EventParticipationType, EventUserLink  # noqa: F401
+from .LeaderboardBucket import LeaderboardBucket  # noqa: F401
+from .LeaderboardEntry import LeaderboardEntry  # noqa: F401
 from .Organiser import Organiser  # noqa: F401
+from .SportSession import SportSession, SportSessionDTO  # noqa: F401
 from .Tag import Tag  # noqa: F401
 from .User import User, UserDTO, UserPublicDTO  # noqa: F401
+from .UserHealthData import HealthDataType, UserHealthData  # noqa: F401
+from .UserHealthRollup import UserHealthDaily, UserHealthHourly, UserHealthRollupDTO  # noqa: F401
 from .UserTagLink import UserTagLink  # noqa: F401
+from .UserWeeklyActivity import UserWeeklyActivity  # noqa: F401
@@ -0,0 +1,60 @@
+import zlib
+from collections.abc import AsyncIterator
+
+from fastapi import HTTPException, Request, status
+from pydantic import ValidationError
+
+# decompressors of the supported Content-Encoding values, the window bits select the gzip/zlib header
+CONTENT_DECODERS = {
+    "identity": None,
+    "gzip": lambda: zlib.decompressobj(wbits=16 + zlib.MAX_WBITS),
+    "deflate": lambda: zlib.decompressobj(),
+}
+
+
+async def request_chunks(request: Request, max_bytes: int | None = None) -> AsyncIterator[bytes]:
+    """
+    Stream the request body, decompressed as it arrives when it is sent with Content-Encoding gzip or deflate.
+    Bodies growing beyond max_bytes after decompression are rejected with 413.
+    """
+    encoding = request.headers.get("content-encoding", "identity").strip().lower()
+    if encoding not in CONTENT_DECODERS:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail=f"Unsupported content encoding {encoding}"
+        )
+    decoder = CONTENT_DECODERS[encoding] and CONTENT_DECODERS[encoding]()
+
+    received = 0
+    async for data in request.stream():
+        if decoder is not None:
+            try:
+                data = decoder.decompress(data)
+            except zlib.error:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid {encoding} body")
+        received += len(data)
+        if max_bytes is not None and received > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"Body is larger than {max_bytes} bytes"
+            )
+        if data:
+            yield data
+    if decoder is not None and not decoder.eof:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Truncated {encoding} body")
+
+
+async def ndjson_lines(request: Request, max_bytes: int | None = None) -> AsyncIterator[bytes]:
+    """
+    Lines of a streamed NDJSON body, see request_chunks
+    """
+    buffer = b""
+    async for data in request_chunks(request, max_bytes):
+        buffer += data
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'row'}: {e['msg']}" for e in error.errors())
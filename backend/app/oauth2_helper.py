@@ -1,5 +1,7 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Callable, TypeVar
 
 import jwt
 from fastapi import Depends, HTTPException, status
@@ -7,15 +9,32 @@ from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
 from pydantic import BaseModel
-from sqlmodel import Session, select
+from sqlalchemy import event
+from sqlalchemy.orm import make_transient_to_detached
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from .database import get_session
+from .cache_helper import TTLCache
+from .database import engine, get_read_session
 from .models.User import User
 from .settings import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# hashes with other rounds than configured are flagged by verify_and_update, so they are rehashed on login
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# bcrypt releases the GIL, so a thread pool runs hashes in parallel without blocking the event loop
+password_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="password")
+password_jobs_pending = 0
+
+T = TypeVar("T")
+
 
 class Token(BaseModel):
     access_token: str
@@ -26,6 +45,37 @@ class TokenData(BaseModel):
     email: str | None = None
 
 
+class PrincipalCache:
+    """
+    Bounded LRU cache of verified tokens to detached user snapshots, so repeated requests with the same token
+    skip the signature check and the user lookup. Entries expire with the token or after the TTL, whichever
+    is first, and are dropped when the user is updated in this process.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self._entries: TTLCache[str, User] = TTLCache(max_size, ttl_seconds)
+
+    def get(self, token: str) -> User | None:
+        return self._entries.get(token)[1]
+
+    def put(self, token: str, token_expires_at: float, user: User):
+        snapshot = User(**user.model_dump())
+        make_transient_to_detached(snapshot)
+        self._entries.put(token, snapshot, token_expires_at)
+
+    def invalidate(self, user_id: int):
+        self._entries.discard_where(lambda user: user.id == user_id)
+
+
+principal_cache = PrincipalCache(settings.principal_cache_size, settings.principal_cache_seconds)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_principal(mapper, connection, target: User):
+    principal_cache.invalidate(target.id)
+
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -34,16 +84,49 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def get_user(session: Session, email: str) -> User | None:
-    return session.exec(select(User).where(User.email == email)).first()
+async def run_password_job(function: Callable[..., T], *args) -> T:
+    """
+    Run password hashing work on the password executor, requests are shed with 503 when too many are pending
+    """
+    global password_jobs_pending
+    if password_jobs_pending >= settings.password_hash_max_pending:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login requests, try again later",
+            headers={"Retry-After": "1"},
+        )
+
+    password_jobs_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, function, *args)
+    finally:
+        password_jobs_pending -= 1
+
 
+async def hash_password(password: str) -> str:
+    return await run_password_job(get_password_hash, password)
 
-def authenticate_user(session: Session, email: str, password: str):
-    user = get_user(session, email)
+
+async def get_user(session: AsyncSession, email: str) -> User | None:
+    return (await session.exec(select(User).where(User.email == email))).first()
+
+
+async def authenticate_user(session: AsyncSession, email: str, password: str):
+    """
+    Look up and verify the user on a read session, only a rehash takes the write connection, after bcrypt ran
+    """
+    user = await get_user(session, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    verified, new_hash = await run_password_job(pwd_context.verify_and_update, password, user.hashed_password)
+    if not verified:
         return False
+    if new_hash:
+        # the cost parameters changed since the password was hashed
+        async with AsyncSession(engine, expire_on_commit=False) as write_session:
+            stored_user = await write_session.get(User, user.id)
+            stored_user.hashed_password = new_hash
+            await write_session.commit()
     return user
 
 
@@ -60,8 +143,12 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ):
+    if cached_user := principal_cache.get(token):
+        # attach the snapshot to the request session without a query
+        return await session.merge(cached_user, load=False)
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -75,7 +162,8 @@ async def get_current_user(
         token_data = TokenData(email=email)
     except InvalidTokenError:
         raise credentials_exception
-    user = get_user(session, email=token_data.email)
+    user = await get_user(session, email=token_data.email)
     if user is None:
         raise credentials_exception
+    principal_cache.put(token, payload.get("exp", float("inf")), user)
     return user
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, or_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .activity_helper import credit_occurrences
+from .database import dialect_insert, engine
+from .models import Event, EventDTO, EventOccurrence, EventRecurrence
+from .settings import settings
+
+RECURRENCE_INTERVALS = {EventRecurrence.weekly: timedelta(weeks=1)}
+
+
+def occurrence_rows(event_id: int, event: EventDTO, after: datetime | None, until: datetime) -> list[dict]:
+    """
+    Occurrences of an event starting after the given (already materialized) occurrence up to until.
+    Events without recurrence have exactly one occurrence, independent of the horizon. Recurring events
+    without occurrences yet start with the first one that has not ended, past weeks are not materialized.
+    """
+    duration = event.end_date - event.start_date
+    if event.recurrence is None:
+        starts = [event.start_date] if after is None else []
+    else:
+        interval = RECURRENCE_INTERVALS[event.recurrence]
+        if event.recurrence_until is not None:
+            until = min(until, event.recurrence_until)
+        starts = []
+        start = next_occurrence(event, datetime.now() - duration) if after is None else after + interval
+        while start is not None and start <= until:
+            starts.append(start)
+            start += interval
+
+    return [{"event_id": event_id, "start_date": start, "end_date": start + duration} for start in starts]
+
+
+def next_occurrence(event: EventDTO, after: datetime) -> datetime | None:
+    """
+    Start of the first occurrence of an event at or after the given date, none when it does not occur anymore
+    """
+    if event.recurrence is None:
+        return event.start_date if event.start_date >= after else None
+
+    interval = RECURRENCE_INTERVALS[event.recurrence]
+    start = event.start_date
+    if start < after:
+        start += interval * -(-(after - start) // interval)
+    if event.recurrence_until is not None and start > event.recurrence_until:
+        return None
+    return start
+
+
+async def materialize_occurrences(session: AsyncSession, events: list[tuple[int, EventDTO]]):
+    """
+    Insert the occurrences of newly created events up to the rolling horizon, the caller commits
+    """
+    until = datetime.now() + timedelta(days=settings.occurrence_horizon_days)
+    rows = [row for event_id, event in events for row in occurrence_rows(event_id, event, None, until)]
+    if rows:
+        await session.execute(insert(EventOccurrence.__table__), rows)
+
+
+async def extend_occurrences(session: AsyncSession, batch_size: int = 500) -> int:
+    """
+    Materialize the occurrences of all active recurring events up to the rolling horizon.
+    Idempotent, so it is safe to run in several workers at once.
+    """
+    now = datetime.now()
+    until = now + timedelta(days=settings.occurrence_horizon_days)
+
+    created, last_event_id = 0, 0
+    while True:
+        events = (
+            await session.exec(
+                select(Event)
+                .where(
+                    Event.recurrence.is_not(None),
+                    or_(Event.recurrence_until.is_(None), Event.recurrence_until >= now),
+                    Event.id > last_event_id,
+                )
+                .order_by(Event.id)
+                .limit(batch_size)
+            )
+        ).all()
+        if not events:
+            return created
+
+        last_starts = dict(
+            (
+                await session.exec(
+                    select(EventOccurrence.event_id, func.max(EventOccurrence.start_date))
+                    .where(EventOccurrence.event_id.in_([event.id for event in events]))
+                    .group_by(EventOccurrence.event_id)
+                )
+            ).all()
+        )
+        rows = [row for event in events for row in occurrence_rows(event.id, event, last_starts.get(event.id), until)]
+        inserted = []
+        if rows:
+            # only the occurrences inserted by this run are credited to the participants
+            inserted = (
+                await session.execute(
+                    dialect_insert(EventOccurrence)
+                    .on_conflict_do_nothing()
+                    .returning(EventOccurrence.event_id, EventOccurrence.start_date, EventOccurrence.end_date),
+                    rows,
+                )
+            ).all()
+            await credit_occurrences(session, inserted)
+        await session.commit()
+
+        created += len(inserted)
+        last_event_id = events[-1].id
+
+
+async def run_occurrence_job():
+    """
+    Keep the occurrences of recurring events materialized for the rolling horizon
+    """
+    while True:
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                created = await extend_occurrences(session)
+            logging.info(f"materialized {created} event occurrences")
+        except Exception:
+            logging.exception("materializing event occurrences failed")
+        await asyncio.sleep(settings.occurrence_refresh_seconds)
@@ -0,0 +1,156 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from datetime import datetime
+
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import EventOccurrence, EventUserLink
+from .recommendation_helper import Recommendation
+
+# best scored events that are fitted into the free time of a user, see plan_events
+PLANNER_CANDIDATES = 200
+
+
+class IntervalIndex:
+    """
+    Busy time as disjoint [start, end) blocks sorted by start, overlapping intervals are merged into one block
+    that keeps them. As the blocks are disjoint their ends are sorted as well, so whether an interval is free is
+    a binary search for the last block starting before its end, and the conflicts are found in the blocks before
+    it that end after its start.
+    """
+
+    def __init__(self, intervals: Iterable[tuple[datetime, datetime, int]] = ()):
+        self._starts: list[datetime] = []
+        self._ends: list[datetime] = []
+        self._intervals: list[list[tuple[datetime, datetime, int]]] = []  # merged into each block
+        # sorted by start, every interval is appended to the last block or after it
+        for start, end, key in sorted(intervals):
+            self.add(start, end, key)
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        index = bisect_left(self._starts, end)
+        return index == 0 or self._ends[index - 1] <= start
+
+    def conflicts(self, start: datetime, end: datetime) -> set[int]:
+        """
+        Keys of the intervals overlapping [start, end)
+        """
+        keys = set()
+        index = bisect_left(self._starts, end) - 1
+        while index >= 0 and self._ends[index] > start:
+            keys.update(
+                key for block_start, block_end, key in self._intervals[index] if block_start < end and block_end > start
+            )
+            index -= 1
+        return keys
+
+    def add(self, start: datetime, end: datetime, key: int):
+        if end <= start:
+            return
+        # the overlapping blocks end after start and start before end
+        first = bisect_right(self._ends, start)
+        last = bisect_left(self._starts, end)
+        intervals = [(start, end, key)]
+        if first < last:
+            for block in self._intervals[first:last]:
+                intervals.extend(block)
+            start = min(start, self._starts[first])
+            end = max(end, self._ends[last - 1])
+        self._starts[first:last] = [start]
+        self._ends[first:last] = [end]
+        self._intervals[first:last] = [intervals]
+
+
+async def busy_intervals(
+    session: AsyncSession, user_id: int, from_date: datetime, to_date: datetime, exclude_event_id: int | None = None
+) -> IntervalIndex:
+    """
+    Occurrences of the events a user participates in overlapping the given range, keyed by their event
+    """
+    # driven by the links of the user, one index range of occurrences per event
+    query = (
+        select(EventOccurrence.start_date, EventOccurrence.end_date, EventOccurrence.event_id)
+        .join(EventUserLink, EventUserLink.event_id == EventOccurrence.event_id)
+        .where(
+            EventUserLink.user_id == user_id,
+            EventOccurrence.start_date < to_date,
+            EventOccurrence.end_date > from_date,
+        )
+    )
+    if exclude_event_id is not None:
+        query = query.where(EventUserLink.event_id != exclude_event_id)
+    return IntervalIndex((await session.exec(query)).all())
+
+
+async def double_bookings(session: AsyncSession, user_id: int, event_id: int) -> list[int]:
+    """
+    Other events of a user overlapping an upcoming occurrence of the given event
+    """
+    occurrences = (
+        await session.exec(
+            select(EventOccurrence.start_date, EventOccurrence.end_date).where(
+                EventOccurrence.event_id == event_id, EventOccurrence.start_date >= datetime.now()
+            )
+        )
+    ).all()
+    if not occurrences:
+        return []
+    busy = await busy_intervals(
+        session,
+        user_id,
+        min(start_date for start_date, _ in occurrences),
+        max(end_date for _, end_date in occurrences),
+        exclude_event_id=event_id,
+    )
+    conflicts = set()
+    for start_date, end_date in occurrences:
+        conflicts |= busy.conflicts(start_date, end_date)
+    return sorted(conflicts)
+
+
+async def candidate_occurrences(
+    session: AsyncSession, event_ids: list[int], from_date: datetime, to_date: datetime
+) -> dict[int, list[tuple[datetime, datetime]]]:
+    """
+    Occurrences of the given events starting in the range by event, ordered by start
+    """
+    occurrences = {}
+    for event_id, start_date, end_date in await session.exec(
+        select(EventOccurrence.event_id, EventOccurrence.start_date, EventOccurrence.end_date)
+        .where(
+            EventOccurrence.event_id.in_(event_ids),
+            EventOccurrence.start_date >= from_date,
+            EventOccurrence.start_date < to_date,
+        )
+        .order_by(EventOccurrence.event_id, EventOccurrence.start_date)
+    ):
+        occurrences.setdefault(event_id, []).append((start_date, end_date))
+    return occurrences
+
+
+def plan_events(
+    busy: IntervalIndex,
+    candidates: list[Recommendation],
+    occurrences: dict[int, list[tuple[datetime, datetime]]],
+    limit: int,
+) -> list[Recommendation]:
+    """
+    Pick the best scored candidates whose occurrences all fit into the free time, every picked event blocks its
+    occurrences for the following candidates, so the picked events do not overlap each other either.
+    Each occurrence is checked in O(log n) of the busy blocks.
+    """
+    planned = []
+    for candidate in sorted(candidates, key=lambda candidate: candidate.score, reverse=True):
+        slots = occurrences.get(candidate.event_id)
+        if not slots or not all(busy.is_free(start_date, end_date) for start_date, end_date in slots):
+            continue
+        for start_date, end_date in slots:
+            busy.add(start_date, end_date, candidate.event_id)
+        planned.append(candidate)
+        if len(planned) == limit:
+            break
+    return planned
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+
+from .settings import settings
+
+
+class Subscription:
+    """
+    Bounded message queue of one client. When the client falls behind, its pending messages are dropped
+    and a single resync message is delivered instead, so publishers never wait for slow consumers.
+    """
+
+    def __init__(self, topics: set[str], max_queue_size: int):
+        self.topics = topics
+        self._queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=max_queue_size)
+        self._lagged = False
+
+    def _put(self, message: dict):
+        if self._queue.full():
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._lagged = True
+        self._queue.put_nowait(message)
+
+    async def get(self) -> dict:
+        if self._lagged:
+            self._lagged = False
+            return {"type": "resync"}
+        return await self._queue.get()
+
+
+class PubSubHub:
+    """
+    In-process publish/subscribe of change notifications by topic, e.g. "events", "event:<id>" or "tag:<name>"
+    """
+
+    def __init__(self, max_queue_size: int):
+        self._max_queue_size = max_queue_size
+        self._subscriptions: dict[str, set[Subscription]] = defaultdict(set)
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @contextmanager
+    def subscribe(self, topics: set[str]):
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(topics, self._max_queue_size)
+        for topic in topics:
+            self._subscriptions[topic].add(subscription)
+        try:
+            yield subscription
+        finally:
+            for topic in topics:
+                self._subscriptions[topic].discard(subscription)
+                if not self._subscriptions[topic]:
+                    del self._subscriptions[topic]
+
+    def publish(self, topics: list[str], message: dict):
+        """
+        Deliver a message to all subscribers of any of the topics, callable from the event loop or worker threads
+        """
+        if self._loop is None or self._loop.is_closed():
+            return
+
+        try:
+            in_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            in_loop = False
+
+        if in_loop:
+            self._deliver(topics, message)
+        else:
+            self._loop.call_soon_threadsafe(self._deliver, topics, message)
+
+    def _deliver(self, topics: list[str], message: dict):
+        subscriptions = set()
+        for topic in topics:
+            subscriptions.update(self._subscriptions.get(topic, ()))
+        for subscription in subscriptions:
+            subscription._put(message)
+        logging.debug(f"published {message.get('type')} to {len(subscriptions)} subscribers")
+
+
+hub = PubSubHub(settings.pubsub_queue_size)
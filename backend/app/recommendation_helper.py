@@ -0,0 +1,298 @@
+import asyncio
+import heapq
+import logging
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import batched
+
+from sqlalchemy import or_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .database import read_engine
+from .geo_helper import haversine_km
+from .models import Event, EventRecurrence, EventTagLink
+from .occurrence_helper import next_occurrence
+from .settings import settings
+
+# weights of the score components, each component is between 0 and 1
+TAG_WEIGHT = 0.4
+DURATION_WEIGHT = 0.2
+DISTANCE_WEIGHT = 0.25
+POPULARITY_WEIGHT = 0.15
+
+# distance and number of participants at which the component is 0.5
+DISTANCE_HALF_KM = 10
+POPULARITY_HALF_PARTICIPANTS = 10
+
+# events changed this long before the last refresh are read again, covering transactions committed late
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+
+@dataclass(slots=True)
+class IndexedEvent:
+    """
+    Columns of an upcoming event needed for scoring, named like EventDTO for next_occurrence
+    """
+
+    event_id: int
+    latitude: float
+    longitude: float
+    start_date: datetime
+    end_date: datetime
+    recurrence: EventRecurrence | None
+    recurrence_until: datetime | None
+    participant_count: int
+    max_participants: int | None
+    tag_ids: frozenset[int]
+    next_start: datetime | None = None
+
+    @property
+    def duration_minutes(self) -> float:
+        return (self.end_date - self.start_date).total_seconds() / 60
+
+    @property
+    def full(self) -> bool:
+        # like the capacity check of joining, no or a non-positive maximum is unlimited
+        return self.max_participants is not None and 0 < self.max_participants <= self.participant_count
+
+
+@dataclass(slots=True)
+class Recommendation:
+    score: float
+    event_id: int
+    next_start: datetime
+    distance_km: float | None
+
+
+def bitmask(positions: Iterable[int]) -> int:
+    """
+    Bitset with the given bits set, built in a bytearray so large sets are not copied once per bit
+    """
+    positions = list(positions)
+    if not positions:
+        return 0
+    data = bytearray(max(positions) // 8 + 1)
+    for position in positions:
+        data[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(data, "little")
+
+
+def set_bits(mask: int) -> Iterator[int]:
+    """
+    Positions of the set bits of a bitset, lowest first
+    """
+    bits = bin(mask)[:1:-1]
+    position = bits.find("1")
+    while position != -1:
+        yield position
+        position = bits.find("1", position + 1)
+
+
+def duration_fit(duration_minutes: float, intensity: int | None) -> float:
+    """
+    1 when the event lasts as long as the user's intensity, falling with the relative difference
+    """
+    if not intensity:
+        return 0.5
+    return 1 / (1 + abs(duration_minutes - intensity) / intensity)
+
+
+class RecommendationIndex:
+    """
+    Upcoming events of the Event table in memory, with a bitset of event slots per tag, so the candidates of a user
+    are the union of the bitsets of the user's tags. Refreshed incrementally from the events updated since the last
+    refresh (joining and leaving update them as well), events are dropped or moved to their next occurrence when
+    they start. Each worker process keeps its own index.
+    """
+
+    def __init__(self):
+        self._events: list[IndexedEvent | None] = []  # by slot
+        self._free_slots: list[int] = []
+        self._slots: dict[int, int] = {}  # slot by event id
+        self._tags: dict[int, int] = {}  # bitset of slots by tag id
+        self._starts: list[tuple[datetime, int]] = []  # heap of (next start, event id), may hold outdated entries
+        self._refreshed_at: datetime | None = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @property
+    def loaded(self) -> bool:
+        return self._refreshed_at is not None
+
+    async def refresh(self, session: AsyncSession, batch_size: int = 500):
+        """
+        Load all upcoming events on the first call, afterwards only the events updated since the last call
+        """
+        async with self._lock:
+            now = datetime.now()
+            columns = select(
+                Event.id,
+                Event.latitude,
+                Event.longitude,
+                Event.start_date,
+                Event.end_date,
+                Event.recurrence,
+                Event.recurrence_until,
+                Event.participant_count,
+                Event.max_participants,
+            )
+            if self._refreshed_at is None:
+                # one query per index, upcoming one-off events by start date and active recurring events
+                queries = [
+                    columns.where(Event.start_date >= now),
+                    columns.where(
+                        Event.recurrence.is_not(None),
+                        or_(Event.recurrence_until.is_(None), Event.recurrence_until >= now),
+                        Event.start_date < now,
+                    ),
+                ]
+            else:
+                queries = [columns.where(Event.updated_at >= self._refreshed_at - REFRESH_OVERLAP)]
+
+            changed = []
+            for query in queries:
+                for batch in batched((await session.exec(query)).all(), batch_size):
+                    tag_ids = defaultdict(set)
+                    for event_id, tag_id in await session.exec(
+                        select(EventTagLink.event_id, EventTagLink.tag_id).where(
+                            EventTagLink.event_id.in_([row[0] for row in batch])
+                        )
+                    ):
+                        tag_ids[event_id].add(tag_id)
+                    changed.extend(IndexedEvent(*row, frozenset(tag_ids[row[0]])) for row in batch)
+            self._update(changed, now)
+            self._refreshed_at = now
+
+    def _update(self, changed: list[IndexedEvent], now: datetime):
+        # all bitset changes of a refresh are applied at once, one new integer per changed tag
+        added, removed = defaultdict(list), defaultdict(list)
+
+        def remove(event_id: int):
+            slot = self._slots.pop(event_id)
+            for tag_id in self._events[slot].tag_ids:
+                removed[tag_id].append(slot)
+            self._events[slot] = None
+            self._free_slots.append(slot)
+
+        for event in changed:
+            event.next_start = next_occurrence(event, now)
+            slot = self._slots.get(event.event_id)
+            if slot is not None:
+                previous = self._events[slot]
+                if event.next_start is None:
+                    remove(event.event_id)
+                    continue
+                for tag_id in previous.tag_ids - event.tag_ids:
+                    removed[tag_id].append(slot)
+                for tag_id in event.tag_ids - previous.tag_ids:
+                    added[tag_id].append(slot)
+                self._events[slot] = event
+                if event.next_start != previous.next_start:
+                    heapq.heappush(self._starts, (event.next_start, event.event_id))
+            elif event.next_start is not None:
+                slot = self._free_slots.pop() if self._free_slots else len(self._events)
+                if slot == len(self._events):
+                    self._events.append(None)
+                self._slots[event.event_id] = slot
+                self._events[slot] = event
+                for tag_id in event.tag_ids:
+                    added[tag_id].append(slot)
+                heapq.heappush(self._starts, (event.next_start, event.event_id))
+
+        # events that started move to their next occurrence or leave the index
+        while self._starts and self._starts[0][0] < now:
+            start, event_id = heapq.heappop(self._starts)
+            slot = self._slots.get(event_id)
+            if slot is None or self._events[slot].next_start != start:
+                continue
+            event = self._events[slot]
+            event.next_start = next_occurrence(event, now)
+            if event.next_start is None:
+                remove(event_id)
+            else:
+                heapq.heappush(self._starts, (event.next_start, event_id))
+
+        for tag_id in added.keys() | removed.keys():
+            mask = self._tags.get(tag_id, 0) & ~bitmask(removed[tag_id]) | bitmask(added[tag_id])
+            if mask:
+                self._tags[tag_id] = mask
+            else:
+                self._tags.pop(tag_id, None)
+
+    def recommend(
+        self,
+        tag_ids: set[int],
+        intensity: int | None,
+        origin: tuple[float, float] | None,
+        radius_km: float,
+        exclude: set[int],
+        limit: int,
+        window: tuple[datetime, datetime] | None = None,
+    ) -> list[Recommendation]:
+        """
+        Best scored upcoming events for a user, only the events sharing a tag with the user are scored unless the
+        user has no tags. Full events and events starting since the last refresh are skipped. With a (from, to)
+        window only the events occurring in it are scored, their next start is the first one in the window.
+        """
+        now = datetime.now()
+        if tag_ids:
+            mask = 0
+            for tag_id in tag_ids:
+                mask |= self._tags.get(tag_id, 0)
+            candidates = (self._events[slot] for slot in set_bits(mask))
+        else:
+            candidates = (event for event in self._events if event is not None)
+
+        def scored() -> Iterator[Recommendation]:
+            for event in candidates:
+                if event.event_id in exclude or event.full:
+                    continue
+                if window is None:
+                    next_start = event.next_start
+                    if next_start < now:
+                        continue
+                else:
+                    next_start = next_occurrence(event, max(window[0], now))
+                    if next_start is None or next_start >= window[1]:
+                        continue
+                distance_km, distance = None, 0.0
+                if origin is not None:
+                    distance_km = haversine_km(*origin, event.latitude, event.longitude)
+                    if distance_km > radius_km:
+                        continue
+                    distance = DISTANCE_HALF_KM / (DISTANCE_HALF_KM + distance_km)
+                overlap = 0.0
+                if tag_ids:
+                    overlap = len(tag_ids & event.tag_ids) / len(tag_ids | event.tag_ids)
+                popularity = event.participant_count / (event.participant_count + POPULARITY_HALF_PARTICIPANTS)
+                score = (
+                    TAG_WEIGHT * overlap
+                    + DURATION_WEIGHT * duration_fit(event.duration_minutes, intensity)
+                    + DISTANCE_WEIGHT * distance
+                    + POPULARITY_WEIGHT * popularity
+                )
+                yield Recommendation(score, event.event_id, next_start, distance_km)
+
+        # a heap of the best limit candidates instead of sorting all of them
+        return heapq.nlargest(limit, scored(), key=lambda recommendation: recommendation.score)
+
+    async def watch(self):
+        """
+        Refresh the index periodically, the first refresh loads all upcoming events
+        """
+        while True:
+            try:
+                async with AsyncSession(read_engine) as session:
+                    await self.refresh(session)
+                logging.debug(f"refreshed the recommendation index, {len(self)} upcoming events")
+            except Exception:
+                logging.exception("refreshing the recommendation index failed")
+            await asyncio.sleep(settings.recommendation_refresh_seconds)
+
+
+recommendation_index = RecommendationIndex()
@@ -3,13 +3,14 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..database import get_session
+from ..database import get_read_session
 from ..oauth2_helper import Token, authenticate_user, create_access_token
 from ..settings import settings
 from .events import router as events_router
 from .health import router as health_router
+from .health_data import router as health_data_router
 from .search import router as search_router
 from .tags import router as tags_router
 from .users import RegistrationRequest, RegistrationResponse, register_user
@@ -20,11 +21,12 @@ router.include_router(events_router, prefix="/events", tags=["events"])
 router.include_router(tags_router, prefix="/tags", tags=["tags"])
 router.include_router(health_router, prefix="/health", tags=["health"])
 router.include_router(users_router, prefix="/users", tags=["users"])
+router.include_router(health_data_router, prefix="/users/me/health-data", tags=["health data"])
 router.include_router(search_router, prefix="/search", tags=["search"])
 
 
 @router.post("/register", response_model=RegistrationResponse, tags=["auth"])
-async def register(registration_data: RegistrationRequest, session: Session = Depends(get_session)):
+async def register(registration_data: RegistrationRequest, session: AsyncSession = Depends(get_read_session)):
     """
     Register endpoint at root level to match frontend expectations
     """
@@ -34,9 +36,9 @@ async def register(registration_data: RegistrationRequest, session: Session = De
 @router.post("/token", tags=["auth"])
 async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_read_session),
 ) -> Token:
-    user = authenticate_user(session, form_data.username, form_data.password)
+    user = await authenticate_user(session, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
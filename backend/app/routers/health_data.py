@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+from enum import Enum
+from itertools import batched
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import BaseModel, ValidationError, model_validator
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..database import get_read_session, get_session
+from ..health_data_helper import store_samples
+from ..models import HealthDataType, User, UserHealthDaily, UserHealthHourly, UserHealthRollupDTO
+from ..ndjson_helper import format_validation_error, ndjson_lines, request_chunks
+from ..oauth2_helper import get_current_user
+from ..settings import settings
+from .events import BulkImportError
+
+router = APIRouter()
+
+# number of deduplicated samples written per transaction
+HEALTH_DATA_CHUNK_SIZE = 5000
+
+
+class HealthDataSampleDTO(BaseModel):
+    data_type: HealthDataType
+    data: int
+    date: datetime
+
+
+class HealthDataColumnsDTO(BaseModel):
+    """
+    Columnar samples, the values at the same position of the lists form one sample
+    """
+
+    data_type: list[HealthDataType]
+    data: list[int]
+    date: list[datetime]
+
+    @model_validator(mode="after")
+    def validate_lengths(self):
+        if not len(self.data_type) == len(self.data) == len(self.date):
+            raise ValueError("data_type, data and date must have the same length")
+        return self
+
+
+class HealthDataImportResponse(BaseModel):
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0  # already stored with the same value or repeated in the payload
+    errors: list[BulkImportError] = []
+
+
+class HealthRollupResolution(str, Enum):
+    hourly = "hourly"
+    daily = "daily"
+
+
+@router.post("", response_model=HealthDataImportResponse)
+async def import_health_data(
+    request: Request, session: AsyncSession = Depends(get_session), current_user: User = Depends(get_current_user)
+):
+    """
+    Import health data samples of the current user, optionally gzip compressed. The body is either NDJSON with one
+    sample per line or, with Content-Type application/json, one object with a list per field.
+    Samples are deduplicated by type and date, the last value wins. Only new and changed samples are written,
+    together with the differences of their hourly and daily rollups.
+    """
+    result = HealthDataImportResponse()
+    samples: dict[tuple[HealthDataType, datetime], int] = {}
+
+    if request.headers.get("content-type", "").split(";")[0].strip() == "application/json":
+        body = b"".join([data async for data in request_chunks(request, settings.health_data_max_body_bytes)])
+        try:
+            columns = HealthDataColumnsDTO.model_validate_json(body)
+        except ValidationError as e:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=format_validation_error(e))
+        result.received = len(columns.data)
+        samples = {
+            (data_type, date): data for data_type, date, data in zip(columns.data_type, columns.date, columns.data)
+        }
+    else:
+        line_number = 0
+        async for line in ndjson_lines(request, settings.health_data_max_body_bytes):
+            line_number += 1
+            if not line.strip():
+                continue
+            try:
+                sample = HealthDataSampleDTO.model_validate_json(line)
+            except ValidationError as e:
+                result.errors.append(BulkImportError(line=line_number, detail=format_validation_error(e)))
+                continue
+            samples[sample.data_type, sample.date] = sample.data
+            result.received += 1
+
+    if result.received > settings.health_data_max_samples:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.health_data_max_samples} samples can be imported at once",
+        )
+
+    for chunk in batched(samples.items(), HEALTH_DATA_CHUNK_SIZE):
+        inserted, updated = await store_samples(session, current_user.id, dict(chunk))
+        result.inserted += inserted
+        result.updated += updated
+    result.unchanged = result.received - result.inserted - result.updated
+    return result
+
+
+@router.get("/{resolution}", response_model=list[UserHealthRollupDTO])
+async def get_health_rollups(
+    resolution: HealthRollupResolution,
+    data_type: list[HealthDataType] = Query([], description="Defaults to all types"),
+    from_date: datetime | None = Query(None, alias="from", description="Defaults to one week before to"),
+    to_date: datetime | None = Query(None, alias="to", description="Defaults to now"),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get the hourly or daily totals of the health data of the current user, read from the rollups
+    instead of aggregating the samples
+    """
+    to_date = to_date or datetime.now()
+    from_date = from_date or to_date - timedelta(weeks=1)
+    model = UserHealthHourly if resolution == HealthRollupResolution.hourly else UserHealthDaily
+
+    # one index range per type
+    return (
+        await session.exec(
+            select(model)
+            .where(
+                model.user_id == current_user.id,
+                model.data_type.in_(data_type or list(HealthDataType)),
+                model.start >= from_date,
+                model.start < to_date,
+            )
+            .order_by(model.data_type, model.start)
+        )
+    ).all()
@@ -1,9 +1,18 @@
-import json
-import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from geopy.exc import GeopyError
 from pydantic import BaseModel
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..conditional_helper import make_etag, not_modified
+from ..database import get_read_session
+from ..geo_helper import geocode
+from ..models import Event
+from ..search_helper import SearchResult, search_index, unified_search
 
 router = APIRouter()
 
@@ -17,53 +26,85 @@ class SearchEvent(BaseModel):
     end_date: datetime | None = None
     url: str | None = None
 
+    id: int | None = None  # set for events of the Event table, none for crawled events
+    snippet: str | None = None  # matching part of the description with highlighted words
+    rank: float | None = None  # BM25 rank of keyword searches, lower is better
+    distance_km: float | None = None  # distance to the location
+
 
 @router.get("", response_model=list[SearchEvent])
-async def search(*, tags: list[str] = Query(...), location: str | None = Query(None)):
+async def search(
+    *,
+    request: Request,
+    response: Response,
+    tags: list[str] = Query([]),
+    location: str | None = Query(None, description='Place name or "latitude,longitude"'),
+    radius_km: float = Query(25, gt=0, le=200, description="Maximum distance to location"),
+    q: str | None = Query(None, description="Keywords to search in name and description, matched as prefixes"),
+    from_date: datetime | None = Query(None, alias="from", description="Defaults to now"),
+    to_date: datetime | None = Query(None, alias="to"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    session: AsyncSession = Depends(get_read_session),
+):
     """
-    get currently cached events from the 'database'
+    Search events and cached crawled events in one ranked list, by keyword relevance, distance and start date
     """
-    PATH_TO_EVENTS = "res/cached-search-results/"
-    events = []
-    for tag in tags:
-        with open(f"{PATH_TO_EVENTS}/{tag}.json", "r") as f:
-            events.extend(json.load(f))
+    now = datetime.now()
+    from_date = from_date or now
 
-    logging.info(f"events: {events}")
+    origin = None
+    if location:
+        try:
+            # Nominatim blocks, so cache misses wait for it in a worker thread
+            origin = await run_in_threadpool(geocode, location)
+        except GeopyError:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Geocoding is unavailable")
+        if origin is None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unknown location")
 
-    for event in events:
-        if event["weekly"]:
-            # get next occurence of the event of this weekday
-            # weekday is saved in the start_date as the day of the week for example "Friday"
-            # we need to convert this to a datetime object
-            weekday = event["start_date"].split(" ")[0]
-            # get the next occurence of this weekday
-            next_occurence = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-            # Convert weekday string to number (0-6, where 0 is Monday)
-            weekday_map = {
-                "Monday": 0,
-                "Tuesday": 1,
-                "Wednesday": 2,
-                "Thursday": 3,
-                "Friday": 4,
-                "Saturday": 5,
-                "Sunday": 6,
-            }
-            target_weekday = weekday_map.get(weekday)
-            if target_weekday is None:
-                event["start_date"] = datetime.fromisoformat(event["start_date"])
-                event["end_date"] = datetime.fromisoformat(event["end_date"])
-                continue  # Skip invalid weekday
+    # results change when events or cached files change or an event starts, so the validator changes every minute
+    last_updated, event_count = (
+        await session.exec(
+            select(select(func.max(Event.updated_at)).scalar_subquery(), select(func.count(Event.id)).scalar_subquery())
+        )
+    ).one()
+    etag = make_etag(
+        request.url.query,
+        search_index.version(tags),
+        last_updated,
+        event_count,
+        now.strftime("%Y-%m-%dT%H:%M"),
+    )
+    if cached := not_modified(request, response, etag):
+        return cached
 
-            # Calculate days until next occurrence
-            days_until = (target_weekday - next_occurence.weekday()) % 7
-            next_occurence += timedelta(days=days_until)
+    results = await unified_search(
+        session,
+        q=q,
+        tags=tags,
+        origin=origin,
+        radius_km=radius_km,
+        from_date=from_date,
+        to_date=to_date,
+        offset=offset,
+        limit=limit,
+    )
+    return [_search_event(result) for result in results]
 
-            event["start_date"] = next_occurence
-            event["end_date"] = next_occurence
-        else:
-            event["start_date"] = datetime.fromisoformat(event["start_date"])
-            event["end_date"] = datetime.fromisoformat(event["end_date"])
 
-    # filter events by date show only events that are in the future or today
-    return [event for event in events if event["start_date"] >= datetime.now()]
+def _search_event(result: SearchResult) -> SearchEvent:
+    event = result.event
+    return SearchEvent(
+        name=event.name,
+        description=event.description,
+        latitude=event.latitude,
+        longitude=event.longitude,
+        start_date=result.start_date,
+        end_date=result.end_date,
+        url=event.url,
+        id=result.event_id,
+        snippet=result.snippet,
+        rank=result.rank,
+        distance_km=result.distance_km,
+    )
@@ -1,39 +1,51 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..database import get_session
+from ..conditional_helper import make_etag, not_modified
+from ..database import get_read_session, get_session
 from ..models import Tag
 
 router = APIRouter()
 
 
 @router.get("", response_model=list[Tag])
-async def get_tags(session: Session = Depends(get_session)):
-    tags = session.exec(select(Tag)).all()
+async def get_tags(request: Request, response: Response, session: AsyncSession = Depends(get_read_session)):
+    # tags are only ever added, so count and highest id act as version of the table
+    tag_count, max_tag_id = (
+        await session.exec(
+            select(select(func.count(Tag.id)).scalar_subquery(), select(func.max(Tag.id)).scalar_subquery())
+        )
+    ).one()
+    if cached := not_modified(request, response, make_etag(tag_count, max_tag_id)):
+        return cached
+
+    tags = (await session.exec(select(Tag))).all()
     return tags
 
 
 @router.get("/{tag_id}", response_model=Tag)
-async def get_tag_by_id(tag_id: int, session: Session = Depends(get_session)):
-    tag = session.exec(select(Tag).where(Tag.id == tag_id)).one_or_none()
+async def get_tag_by_id(tag_id: int, session: AsyncSession = Depends(get_read_session)):
+    tag = (await session.exec(select(Tag).where(Tag.id == tag_id))).one_or_none()
     if not tag:
         raise HTTPException(status_code=404, detail="Tag not found")
     return tag
 
 
 @router.post("", response_model=Tag)
-async def create_tag(tag: Tag, session: Session = Depends(get_session)):
+async def create_tag(tag: Tag, session: AsyncSession = Depends(get_session)):
     # cleanup the tag name
     tag_name = tag.name.strip().lower()
     tag_name = tag_name.replace(" ", "_")  # replace spaces with underscores
 
     # check if the tag already exists
-    existing_tag = session.exec(select(Tag).where(Tag.name == tag_name)).one_or_none()
+    existing_tag = (await session.exec(select(Tag).where(Tag.name == tag_name))).one_or_none()
     if existing_tag:
         raise HTTPException(status_code=400, detail="Tag already exists")
 
     new_tag = Tag(name=tag.name, emoji=tag.emoji)
     session.add(new_tag)
-    session.commit()
-    session.refresh(new_tag)
+    await session.commit()
+    await session.refresh(new_tag)
     return new_tag
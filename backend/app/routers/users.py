@@ -1,13 +1,45 @@
-from datetime import datetime
+from collections import defaultdict
+from datetime import datetime, timedelta
+from enum import Enum
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from pydantic import BaseModel, field_validator
-from sqlmodel import Session, select
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from ..database import get_session
-from ..models import Event, Tag, User, UserDTO, UserPublicDTO, UserTagLink
-from ..oauth2_helper import get_current_user, get_password_hash
+from ..activity_helper import week_start
+from ..conditional_helper import make_etag, not_modified
+from ..database import engine, get_read_session
+from ..leaderboard_helper import (
+    AgeBand,
+    RankedEntry,
+    leaderboard_neighbours,
+    leaderboard_page,
+    leaderboard_scope,
+    leaderboard_version,
+)
+from ..models import (
+    Event,
+    EventDTO,
+    EventParticipationType,
+    EventUserLink,
+    SportSession,
+    SportSessionDTO,
+    Tag,
+    User,
+    UserDTO,
+    UserPublicDTO,
+    UserTagLink,
+    UserWeeklyActivity,
+)
+from ..oauth2_helper import get_current_user, hash_password
+from ..pagination_helper import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from ..planner_helper import PLANNER_CANDIDATES, busy_intervals, candidate_occurrences, plan_events
+from ..recommendation_helper import recommendation_index
+from ..settings import settings
 
 router = APIRouter()
 
@@ -20,6 +52,56 @@ class UserWithTagsDTO(UserDTO):
     tags: list[Tag]
 
 
+class UserEventStatus(str, Enum):
+    upcoming = "upcoming"
+    past = "past"
+
+
+class UserEventDTO(EventDTO):
+    """
+    Event together with how the user participates, flat like the event for the calendar
+    """
+
+    id: int
+    created_at: datetime
+    updated_at: datetime
+    participant_count: int
+    participation_type: EventParticipationType
+    score: int | None = None
+
+
+class LeaderboardEntryDTO(UserPublicWithTagsDTO):
+    rank: int  # users with the same level share a rank
+
+
+class RecommendedEventDTO(EventDTO):
+    """
+    Upcoming event recommended to the user, flat like the event
+    """
+
+    id: int
+    participant_count: int
+    next_start_date: datetime  # start_date is the first occurrence of recurring events
+    score: float  # between 0 and 1, higher is better
+    distance_km: float | None = None  # set when a location is given
+
+
+class PlannedEventDTO(RecommendedEventDTO):
+    """
+    Event fitting into the free time of the user, next_start_date is its first occurrence in the planned range
+    """
+
+    occurrences: list[SportSessionDTO]  # start and end dates of the occurrences in the planned range
+
+
+class WeeklyActivityDTO(BaseModel):
+    week: datetime  # Monday 00:00
+    minutes: float  # from step counts and the event occurrences the user participates in
+    goal_minutes: int
+    missing_minutes: float
+    sessions: list[SportSessionDTO]  # suggested sessions from now on
+
+
 class RegistrationRequest(BaseModel):
     # User account fields (optional for now since frontend doesn't include them)
     email: Optional[str] = None
@@ -44,7 +126,7 @@ class RegistrationResponse(BaseModel):
 
 
 @router.post("/register", response_model=RegistrationResponse)
-async def register_user(registration_data: RegistrationRequest, session: Session = Depends(get_session)):
+async def register_user(registration_data: RegistrationRequest, session: AsyncSession = Depends(get_read_session)):
     """
     Register a new user with profile information
     """
@@ -54,13 +136,16 @@ async def register_user(registration_data: RegistrationRequest, session: Session
     password = registration_data.password or "temppassword123"  # Temporary password
 
     # Check if user already exists
-    existing_user = session.exec(select(User).where(User.email == email)).first()
+    existing_user = (await session.exec(select(User.id).where(User.email == email))).first()
 
     if existing_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email already exists")
 
+    # hashed before the write connection is taken, so other writers do not wait for bcrypt
+    hashed_password = await hash_password(password)
+    tags = (await session.exec(select(Tag).where(Tag.name.in_(registration_data.tags)))).all()
+
     # Create user with all information in a single record
-    hashed_password = get_password_hash(password)
     user = User(
         email=email,
         username=username,
@@ -70,13 +155,15 @@ async def register_user(registration_data: RegistrationRequest, session: Session
         bonus_points=0,
         level=0.0,
     )
-    session.add(user)
-
-    tags = session.exec(select(Tag).where(Tag.name.in_(registration_data.tags))).all()
-    user_tags = [UserTagLink(user_id=user.id, tag_id=tag.id) for tag in tags]
-    session.add_all(user_tags)
-
-    session.commit()
+    async with AsyncSession(engine, expire_on_commit=False) as write_session:
+        write_session.add(user)
+        try:
+            await write_session.flush()
+        except IntegrityError:
+            # registered by a concurrent request since the check above
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User with this email already exists")
+        write_session.add_all([UserTagLink(user_id=user.id, tag_id=tag.id) for tag in tags])
+        await write_session.commit()
 
     return RegistrationResponse(
         message="User registered successfully",
@@ -87,16 +174,19 @@ async def register_user(registration_data: RegistrationRequest, session: Session
             birthday=user.birthday,
             intensity=user.intensity,
             level=user.level,
-            tags=user.tags,
+            tags=tags,
         ),
     )
 
 
 @router.get("/me", response_model=UserWithTagsDTO)
-async def get_users_me(*, current_user: User = Depends(get_current_user)):
+async def get_users_me(
+    *, session: AsyncSession = Depends(get_read_session), current_user: User = Depends(get_current_user)
+):
     """
     Get the current user
     """
+    tags = (await session.exec(select(Tag).join(UserTagLink).where(UserTagLink.user_id == current_user.id))).all()
     return UserWithTagsDTO(
         email=current_user.email,
         username=current_user.username,
@@ -104,29 +194,302 @@ async def get_users_me(*, current_user: User = Depends(get_current_user)):
         birthday=current_user.birthday,
         intensity=current_user.intensity,
         level=current_user.level,
-        tags=current_user.tags,
+        tags=tags,
     )
 
 
-@router.get("/me/events", response_model=list[Event])
-async def get_users_meevents(*, current_user: User = Depends(get_current_user)):
+@router.get("/me/activity", response_model=WeeklyActivityDTO)
+async def get_users_me_activity(
+    *, session: AsyncSession = Depends(get_read_session), current_user: User = Depends(get_current_user)
+):
     """
-    Get the events for the current user
+    Get the active minutes of the current user in this week towards the WHO goal and the sessions suggested
+    to reach it
     """
-    return current_user.events
+    now = datetime.now()
+    week = week_start(now)
+    minutes = (
+        await session.exec(
+            select(UserWeeklyActivity.minutes).where(
+                UserWeeklyActivity.user_id == current_user.id, UserWeeklyActivity.week == week
+            )
+        )
+    ).first() or 0.0
+    sessions = (
+        await session.exec(
+            select(SportSession)
+            .where(SportSession.user_id == current_user.id, SportSession.start_date >= now)
+            .order_by(SportSession.start_date)
+        )
+    ).all()
+    return WeeklyActivityDTO(
+        week=week,
+        minutes=minutes,
+        goal_minutes=settings.activity_goal_minutes,
+        missing_minutes=max(settings.activity_goal_minutes - minutes, 0.0),
+        sessions=sessions,
+    )
 
 
-@router.get("/leaderboard", response_model=list[UserPublicWithTagsDTO])
-async def get_leaderboard(session: Session = Depends(get_session)):
+@router.get("/me/recommendations", response_model=list[RecommendedEventDTO])
+async def get_users_me_recommendations(
+    *,
+    lat: float | None = Query(None, ge=-90, le=90),
+    lon: float | None = Query(None, ge=-180, le=180),
+    radius_km: float = Query(25, gt=0, le=200, description="Maximum distance to lat and lon"),
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+):
     """
-    Get the leaderboard
+    Get upcoming events the current user does not participate in yet, best first. Events are scored by the overlap
+    with the user's tags, how well their duration fits the user's intensity, their distance to lat and lon and
+    their number of participants.
     """
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="lat and lon must be given together")
+    if not recommendation_index.loaded:
+        await recommendation_index.refresh(session)
+
+    tag_ids = set((await session.exec(select(UserTagLink.tag_id).where(UserTagLink.user_id == current_user.id))).all())
+    joined = set(
+        (await session.exec(select(EventUserLink.event_id).where(EventUserLink.user_id == current_user.id))).all()
+    )
+    recommendations = recommendation_index.recommend(
+        tag_ids,
+        current_user.intensity,
+        None if lat is None else (lat, lon),
+        radius_km,
+        joined,
+        limit,
+    )
+    if not recommendations:
+        return []
+
+    # only the rows of the recommended events are loaded
+    events = (
+        await session.exec(
+            select(Event).where(Event.id.in_([recommendation.event_id for recommendation in recommendations]))
+        )
+    ).all()
+    events_by_id = {event.id: event for event in events}
     return [
-        UserPublicWithTagsDTO(
-            email=user.email,
-            username=user.username,
-            level=user.level,
-            tags=user.tags,
+        RecommendedEventDTO(
+            **events_by_id[recommendation.event_id].model_dump(),
+            next_start_date=recommendation.next_start,
+            score=recommendation.score,
+            distance_km=recommendation.distance_km,
         )
-        for user in session.exec(select(User).order_by(User.level.desc())).all()
+        for recommendation in recommendations
+        if recommendation.event_id in events_by_id
     ]
+
+
+@router.get("/me/plan", response_model=list[PlannedEventDTO])
+async def get_users_me_plan(
+    *,
+    from_date: datetime | None = Query(None, alias="from", description="Defaults to now"),
+    to_date: datetime | None = Query(None, alias="to", description="Defaults to one week after from"),
+    lat: float | None = Query(None, ge=-90, le=90),
+    lon: float | None = Query(None, ge=-180, le=180),
+    radius_km: float = Query(25, gt=0, le=200, description="Maximum distance to lat and lon"),
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get events occurring in the given range that fit into the free time of the current user, ordered by their
+    first occurrence. Of the best recommendations (see /me/recommendations) occurring in the range, an event is
+    suggested when none of its occurrences in the range overlaps an event the user participates in or a better
+    suggestion.
+    """
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="lat and lon must be given together")
+    from_date = max(from_date or datetime.now(), datetime.now())
+    to_date = to_date or from_date + timedelta(weeks=1)
+    if to_date <= from_date:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="to must be after from and now")
+    if not recommendation_index.loaded:
+        await recommendation_index.refresh(session)
+
+    tag_ids = set((await session.exec(select(UserTagLink.tag_id).where(UserTagLink.user_id == current_user.id))).all())
+    joined = set(
+        (await session.exec(select(EventUserLink.event_id).where(EventUserLink.user_id == current_user.id))).all()
+    )
+    candidates = recommendation_index.recommend(
+        tag_ids,
+        current_user.intensity,
+        None if lat is None else (lat, lon),
+        radius_km,
+        joined,
+        PLANNER_CANDIDATES,
+        window=(from_date, to_date),
+    )
+    if not candidates:
+        return []
+
+    occurrences = await candidate_occurrences(
+        session, [candidate.event_id for candidate in candidates], from_date, to_date
+    )
+    # the busy intervals are loaded once, every occurrence of a candidate is a binary search in them
+    busy = await busy_intervals(session, current_user.id, from_date, to_date)
+    planned = plan_events(busy, candidates, occurrences, limit)
+    if not planned:
+        return []
+
+    events = (await session.exec(select(Event).where(Event.id.in_([event.event_id for event in planned])))).all()
+    events_by_id = {event.id: event for event in events}
+    return sorted(
+        (
+            PlannedEventDTO(
+                **events_by_id[event.event_id].model_dump(),
+                next_start_date=occurrences[event.event_id][0][0],
+                score=event.score,
+                distance_km=event.distance_km,
+                occurrences=[
+                    SportSessionDTO(start_date=start_date, end_date=end_date)
+                    for start_date, end_date in occurrences[event.event_id]
+                ],
+            )
+            for event in planned
+            if event.event_id in events_by_id
+        ),
+        key=lambda event: (event.next_start_date, event.id),
+    )
+
+
+@router.get("/me/events", response_model=list[UserEventDTO])
+async def get_users_meevents(
+    *,
+    response: Response,
+    event_status: UserEventStatus | None = Query(None, alias="status", description="Defaults to all events"),
+    from_date: datetime | None = Query(None, alias="from", description="Only events starting at or after"),
+    to_date: datetime | None = Query(None, alias="to", description="Only events starting before"),
+    cursor: str | None = Query(None, description="Value of the X-Next-Cursor header of the previous page"),
+    limit: int = Query(100, ge=1, le=500),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get the events of the current user together with how they participate, ordered by start date.
+    Past events are ordered from the most recent one back, recurring events are upcoming until their last occurrence.
+    """
+    now = datetime.now()
+    # driven by the links of the user, so only their events are read and sorted
+    query = (
+        select(Event, EventUserLink.participation_type, EventUserLink.score)
+        .join(EventUserLink, EventUserLink.event_id == Event.id)
+        .where(EventUserLink.user_id == current_user.id)
+    )
+    upcoming = or_(
+        Event.end_date >= now,
+        and_(Event.recurrence.is_not(None), or_(Event.recurrence_until.is_(None), Event.recurrence_until >= now)),
+    )
+    if event_status == UserEventStatus.upcoming:
+        query = query.where(upcoming)
+    elif event_status == UserEventStatus.past:
+        query = query.where(~upcoming)
+    if from_date is not None:
+        query = query.where(Event.start_date >= from_date)
+    if to_date is not None:
+        query = query.where(Event.start_date < to_date)
+
+    descending = event_status == UserEventStatus.past
+    key = tuple_(Event.start_date, Event.id)
+    if cursor:
+        start_date, event_id = decode_cursor(cursor, datetime, int)
+        query = query.where(key < tuple_(start_date, event_id) if descending else key > tuple_(start_date, event_id))
+    order = (Event.start_date.desc(), Event.id.desc()) if descending else (Event.start_date, Event.id)
+
+    rows = (await session.exec(query.order_by(*order).limit(limit))).all()
+
+    if len(rows) == limit:
+        last_event = rows[-1][0]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last_event.start_date, last_event.id)
+    return [
+        UserEventDTO(**event.model_dump(), participation_type=participation_type, score=score)
+        for event, participation_type, score in rows
+    ]
+
+
+async def _leaderboard_scope(session: AsyncSession, tag: str | None, age_band: AgeBand | None) -> str | None:
+    """
+    Scope of the filtered leaderboard, none when the tag does not exist
+    """
+    tag_id = None
+    if tag is not None:
+        tag_id = (await session.exec(select(Tag.id).where(Tag.name == tag).order_by(Tag.id).limit(1))).first()
+        if tag_id is None:
+            return None
+    return leaderboard_scope(tag_id, age_band)
+
+
+async def _with_tags(session: AsyncSession, entries: list[RankedEntry]) -> list[LeaderboardEntryDTO]:
+    tags = defaultdict(list)
+    for user_id, tag in await session.exec(
+        select(UserTagLink.user_id, Tag)
+        .join(Tag, Tag.id == UserTagLink.tag_id)
+        .where(UserTagLink.user_id.in_([entry.user_id for entry in entries]))
+    ):
+        tags[user_id].append(tag)
+    return [
+        LeaderboardEntryDTO(
+            rank=entry.rank, email=entry.email, username=entry.username, level=entry.level, tags=tags[entry.user_id]
+        )
+        for entry in entries
+    ]
+
+
+@router.get("/leaderboard", response_model=list[LeaderboardEntryDTO])
+async def get_leaderboard(
+    request: Request,
+    response: Response,
+    tag: str | None = Query(None, description="Only users interested in this tag"),
+    age_band: AgeBand | None = Query(None, description="Only users of this age"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = Query(None, description="Value of the X-Next-Cursor header of the previous page"),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Get the leaderboard ordered by level, optionally only of the users of a tag and/or an age band.
+    Paginated by offset or with a keyset cursor, users with the same level share their rank.
+    """
+    scope = await _leaderboard_scope(session, tag, age_band)
+    version = await leaderboard_version(session, scope) if scope is not None else None
+    # the page is only read when the leaderboard changed since the client copy
+    etag = make_etag(scope, version, offset, limit, cursor)
+    if cached := not_modified(request, response, etag):
+        return cached
+
+    entries = []
+    if scope is not None:
+        after = decode_cursor(cursor, int, float, int, int) if cursor else None
+        entries = await leaderboard_page(session, scope, offset, limit, after)
+    leaderboard = await _with_tags(session, entries)
+
+    if len(entries) == limit:
+        last = entries[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.bucket, last.level, last.user_id, last.position)
+    return leaderboard
+
+
+@router.get("/me/leaderboard", response_model=list[LeaderboardEntryDTO])
+async def get_users_me_leaderboard(
+    *,
+    tag: str | None = Query(None, description="Only users interested in this tag"),
+    age_band: AgeBand | None = Query(None, description="Only users of this age"),
+    neighbours: int = Query(5, ge=0, le=50, description="Number of users ranked directly before and after"),
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get the rank of the current user together with the users ranked around them
+    """
+    scope = await _leaderboard_scope(session, tag, age_band)
+    entries = None
+    if scope is not None:
+        entries = await leaderboard_neighbours(session, scope, current_user.id, neighbours)
+    if entries is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="You are not on this leaderboard")
+    return await _with_tags(session, entries)
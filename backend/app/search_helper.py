@@ -0,0 +1,481 @@
+import asyncio
+import heapq
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections import defaultdict
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, column, func, literal_column, or_, table
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .geo_helper import bounding_box, grid_cell_ranges, haversine_km, haversine_km_sql
+from .models import Event, EventTagLink, Tag
+from .occurrence_helper import next_occurrence
+from .settings import settings
+from .snapshot_helper import CachedEvent, Snapshot, SnapshotEvents, read_cached_events
+
+SNIPPET_TOKENS = 12
+
+event_fts = table("event_fts", column("rowid"))
+
+# search table and rowid of a crawled search result
+SnippetSource = tuple[sqlite3.Connection, int]
+
+
+def fts_query(q: str) -> str | None:
+    """
+    FTS5 query matching all words of the input, each as prefix
+    """
+    words = re.findall(r"\w+", q)
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+class SearchIndex:
+    """
+    Index of the crawled events per tag. Served from the memory-mapped snapshot when it was compiled from the
+    current JSON files, otherwise from the JSON files, where a tag file is only parsed again when its mtime changes.
+    Keyword search runs on an in-memory FTS5 table rebuilt whenever the events changed.
+    """
+
+    def __init__(self, path: str, snapshot_path: str):
+        self._path = path
+        self._snapshot_path = snapshot_path
+        # mapped snapshot with its mtime, kept while it is stale so it is not mapped again on every reload
+        self._snapshot: tuple[int, dict[str, tuple[int, Sequence[CachedEvent]]]] | None = None
+        self._tags: dict[str, tuple[int, Sequence[CachedEvent]]] = {}
+        # search table together with the tags it was built from, swapped as one on reload
+        self._fts: tuple[dict[str, tuple[int, Sequence[CachedEvent]]], sqlite3.Connection] | None = None
+        self._fts_lock = threading.Lock()
+
+    def events(self, tag: str) -> Sequence[CachedEvent]:
+        return self._tags.get(tag, (0, []))[1]
+
+    def all_events(self) -> list[CachedEvent]:
+        return [event for _, events in self._tags.values() for event in events]
+
+    def version(self, tags: list[str]) -> list[int]:
+        if not tags:
+            return sorted(mtime for mtime, _ in self._tags.values())
+        return [self._tags.get(tag, (0, []))[0] for tag in tags]
+
+    def search(self, q: str, tags: list[str]) -> list[tuple[float, CachedEvent, SnippetSource]]:
+        """
+        Keyword search over the crawled events, returns (rank, event, snippet source) best match first.
+        Snippets are only made for the selected page, see snippets.
+        """
+        query = fts_query(q)
+        if query is None or self._fts is None:
+            return []
+        tags_by_name, fts = self._fts
+
+        sql = "SELECT rowid, tag, position, rank FROM crawled_fts WHERE crawled_fts MATCH ?"
+        parameters = [query]
+        if tags:
+            sql += f" AND tag IN ({', '.join('?' * len(tags))})"
+            parameters.extend(tags)
+        with self._fts_lock:
+            rows = fts.execute(sql + " ORDER BY rank", parameters).fetchall()
+        return [(rank, tags_by_name[tag][1][position], (fts, rowid)) for rowid, tag, position, rank in rows]
+
+    def snippets(self, q: str, sources: list[SnippetSource]) -> dict[SnippetSource, str]:
+        """
+        Snippets of the given search results, read from the search table they were found in even when it was
+        swapped by a reload since
+        """
+        rowids = defaultdict(list)
+        for fts, rowid in sources:
+            rowids[fts].append(rowid)
+        snippets = {}
+        with self._fts_lock:
+            for fts, fts_rowids in rowids.items():
+                rows = fts.execute(
+                    "SELECT rowid, snippet(crawled_fts, -1, '<b>', '</b>', '…', ?) FROM crawled_fts"
+                    f" WHERE crawled_fts MATCH ? AND rowid IN ({', '.join('?' * len(fts_rowids))})",
+                    [SNIPPET_TOKENS, fts_query(q), *fts_rowids],
+                )
+                snippets.update(((fts, rowid), snippet) for rowid, snippet in rows)
+        return snippets
+
+    def load(self):
+        """
+        (Re)load the snapshot or changed tag files, blocking, so run it in a worker thread when the event loop
+        is running
+        """
+        file_mtimes = self._file_mtimes()
+        tags = None
+        if os.path.exists(self._snapshot_path):
+            tags = self._load_snapshot(file_mtimes)
+        else:
+            self._snapshot = None
+        if tags is None:
+            tags = self._load_files(file_mtimes or {})
+
+        if tags is not self._tags:
+            self._fts = (tags, self._build_fts(tags))
+            self._tags = tags
+
+    def _file_mtimes(self) -> dict[str, int] | None:
+        """
+        mtime of each tag file, none when only the snapshot is deployed
+        """
+        if not os.path.isdir(self._path):
+            return None
+        mtimes = {}
+        for entry in os.scandir(self._path):
+            tag, extension = os.path.splitext(entry.name)
+            if extension == ".json":
+                mtimes[tag] = entry.stat().st_mtime_ns
+        return mtimes
+
+    def _load_snapshot(self, file_mtimes: dict[str, int] | None) -> dict[str, tuple[int, Sequence[CachedEvent]]] | None:
+        """
+        Tags of the snapshot, none when a tag file was changed, added or removed after it was compiled
+        """
+        mtime = os.stat(self._snapshot_path).st_mtime_ns
+        mapped = self._snapshot is None or self._snapshot[0] != mtime
+        if mapped:
+            snapshot = Snapshot(self._snapshot_path)
+            tags = {
+                tag: (version, SnapshotEvents(snapshot, positions))
+                for tag, (version, positions) in snapshot.tags.items()
+            }
+            self._snapshot = (mtime, tags)
+            logging.info(f"mapped {len(snapshot)} cached search results from {self._snapshot_path}")
+        tags = self._snapshot[1]
+
+        if file_mtimes is not None and file_mtimes != {tag: version for tag, (version, _) in tags.items()}:
+            if mapped or tags is self._tags:
+                logging.warning(f"{self._snapshot_path} is older than the files in {self._path}, serving the files")
+            return None
+        return tags
+
+    def _load_files(self, file_mtimes: dict[str, int]) -> dict[str, tuple[int, Sequence[CachedEvent]]]:
+        tags, changed = {}, False
+        for tag, mtime in file_mtimes.items():
+            if tag in self._tags and self._tags[tag][0] == mtime:
+                tags[tag] = self._tags[tag]
+                continue
+
+            tags[tag] = (mtime, read_cached_events(os.path.join(self._path, f"{tag}.json")))
+            changed = True
+            logging.info(f"loaded {len(tags[tag][1])} cached search results for {tag}")
+
+        if changed or tags.keys() != self._tags.keys():
+            return tags
+        return self._tags
+
+    @staticmethod
+    def _build_fts(tags: dict[str, tuple[int, Sequence[CachedEvent]]]) -> sqlite3.Connection:
+        fts = sqlite3.connect(":memory:", check_same_thread=False)
+        fts.execute(
+            "CREATE VIRTUAL TABLE crawled_fts USING fts5(name, description, tag UNINDEXED, position UNINDEXED, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        fts.executemany(
+            "INSERT INTO crawled_fts VALUES (?, ?, ?, ?)",
+            (
+                (event.name, event.description, tag, position)
+                for tag, (_, events) in tags.items()
+                for position, event in enumerate(events)
+            ),
+        )
+        return fts
+
+    async def watch(self):
+        """
+        Reload changed tag files periodically without blocking the event loop
+        """
+        while True:
+            await asyncio.sleep(settings.search_reload_seconds)
+            try:
+                await run_in_threadpool(self.load)
+            except OSError:
+                logging.exception("reloading cached search results failed")
+
+
+search_index = SearchIndex(settings.search_results_path, settings.search_snapshot_path)
+
+
+@dataclass(slots=True)
+class SearchResult:
+    """
+    Candidate of a unified search, rows of the Event table are only loaded for the selected page
+    """
+
+    cost: tuple
+    name: str
+    start_date: datetime
+    end_date: datetime
+    event_id: int | None = None
+    event: Event | CachedEvent | None = None
+    rank: float | None = None
+    snippet: str | None = None
+    snippet_source: SnippetSource | None = None  # of crawled keyword search results
+    distance_km: float | None = None
+
+
+async def unified_search(
+    session: AsyncSession,
+    *,
+    q: str | None,
+    tags: list[str],
+    origin: tuple[float, float] | None,
+    radius_km: float,
+    from_date: datetime,
+    to_date: datetime | None,
+    offset: int,
+    limit: int,
+) -> list[SearchResult]:
+    """
+    Search the Event table and the crawled events at once, filtered by keywords, tags, dates and distance to origin.
+    The database returns only its best offset + limit events, duplicates across both sources are merged, the best
+    offset + limit candidates are selected with a heap and only then the matching Event rows and the snippets
+    are loaded.
+    """
+    if q is not None and fts_query(q) is None:
+        return []
+
+    top_k = offset + limit
+    candidates = await _event_candidates(session, q, tags, origin, radius_km, from_date, to_date, top_k)
+    # the keyword search and the filtering of the crawled events run in a worker thread, off the event loop
+    candidates += await run_in_threadpool(_cached_candidates, q, tags, origin, radius_km, from_date, to_date)
+
+    best: dict[tuple, SearchResult] = {}
+    for candidate in candidates:
+        key = _result_key(candidate)
+        if key not in best or candidate.cost < best[key].cost:
+            best[key] = candidate
+    page = heapq.nsmallest(top_k, best.values(), key=lambda candidate: candidate.cost)[offset:]
+
+    event_ids = [result.event_id for result in page if result.event_id is not None]
+    if event_ids:
+        events = {event.id: event for event in (await session.exec(select(Event).where(Event.id.in_(event_ids)))).all()}
+        for result in page:
+            if result.event_id is not None:
+                result.event = events[result.event_id]
+
+    if q is not None:
+        if event_ids and session.bind.dialect.name == "sqlite":
+            fts = literal_column("event_fts")
+            snippets = dict(
+                (
+                    await session.exec(
+                        select(event_fts.c.rowid, func.snippet(fts, -1, "<b>", "</b>", "…", SNIPPET_TOKENS)).where(
+                            fts.op("MATCH")(fts_query(q)), event_fts.c.rowid.in_(event_ids)
+                        )
+                    )
+                ).all()
+            )
+            for result in page:
+                if result.event_id is not None:
+                    result.snippet = snippets.get(result.event_id)
+        sources = [result.snippet_source for result in page if result.snippet_source is not None]
+        if sources:
+            snippets = await run_in_threadpool(search_index.snippets, q, sources)
+            for result in page:
+                if result.snippet_source is not None:
+                    result.snippet = snippets.get(result.snippet_source)
+    return page
+
+
+def _result_key(result: SearchResult) -> tuple:
+    # the same event crawled and created, or created twice
+    return re.sub(r"\W+", "", result.name.casefold()), result.start_date.date()
+
+
+def _cost(
+    relevance: float | None, distance_km: float | None, radius_km: float, start_date: datetime, source: int
+) -> tuple:
+    # the BM25 ranks of both sources are not comparable, so the relevance is the rank relative to the best match
+    # of its source, between 0 and 1 like the distance as fraction of the radius, then the earliest event wins
+    proximity = distance_km / radius_km if distance_km is not None else 0.0
+    return (proximity - (relevance or 0.0), start_date, source)
+
+
+async def _event_candidates(
+    session: AsyncSession,
+    q: str | None,
+    tags: list[str],
+    origin: tuple[float, float] | None,
+    radius_km: float,
+    from_date: datetime,
+    to_date: datetime | None,
+    top_k: int,
+) -> list[SearchResult]:
+    # recurring events match while they recur in the range
+    filters = [
+        or_(
+            and_(Event.recurrence.is_(None), Event.start_date >= from_date),
+            and_(
+                Event.recurrence.is_not(None),
+                or_(Event.recurrence_until.is_(None), Event.recurrence_until >= from_date),
+            ),
+        )
+    ]
+    if to_date is not None:
+        filters.append(Event.start_date < to_date)
+    if tags:
+        filters.append(Event.id.in_(select(EventTagLink.event_id).join(Tag).where(Tag.name.in_(tags))))
+    query = select(
+        Event.id,
+        Event.name,
+        Event.start_date,
+        Event.end_date,
+        Event.latitude,
+        Event.longitude,
+        Event.recurrence,
+        Event.recurrence_until,
+    )
+
+    proximity = None
+    if origin is not None:
+        latitude, longitude = origin
+        min_latitude, max_latitude, min_longitude, max_longitude = bounding_box(latitude, longitude, radius_km)
+        filters.append(
+            or_(
+                *(
+                    Event.geo_cell.between(first, last)
+                    for first, last in grid_cell_ranges(latitude, longitude, radius_km)
+                )
+            )
+        )
+        filters.append(Event.latitude.between(min_latitude, max_latitude))
+        if -180 <= min_longitude and max_longitude <= 180:
+            filters.append(Event.longitude.between(min_longitude, max_longitude))
+        # the exact distance is only computed for the events of the grid cells, and pruned in the database
+        distance_km = haversine_km_sql(latitude, longitude, Event.latitude, Event.longitude)
+        filters.append(distance_km <= radius_km)
+        query = query.add_columns(distance_km.label("distance_km"))
+        proximity = distance_km / radius_km
+
+    ranked = q is not None and session.bind.dialect.name == "sqlite"
+    if ranked:
+        rank = literal_column("event_fts.rank")
+        query = (
+            query.add_columns(rank.label("rank"))
+            .join(event_fts, event_fts.c.rowid == Event.id)
+            .where(literal_column("event_fts").op("MATCH")(fts_query(q)))
+        )
+        if proximity is not None:
+            # the best match passing the filters has the most negative rank, see _cost
+            best_rank = func.min(rank).over()
+            relevance = func.coalesce(rank / best_rank, 0.0)
+            query = query.add_columns(best_rank.label("best_rank"))
+    elif q is not None:
+        # without FTS5 every word has to appear in name or description, unranked
+        for word in re.findall(r"\w+", q):
+            filters.append(or_(Event.name.ilike(f"%{word}%"), Event.description.ilike(f"%{word}%")))
+    query = query.where(*filters)
+
+    # the database orders by the cost, so only the best rows are read. Start dates of recurring events are only
+    # known after reading them and duplicates are merged afterwards, so the rows are read in batches of top k
+    # until top k distinct candidates are found.
+    if ranked:
+        # ordering by rank alone is sorted by FTS5 itself
+        ordered = query.order_by(rank if proximity is None else proximity - relevance)
+        candidates = []
+    else:
+        order = (Event.start_date,) if proximity is None else (proximity, Event.start_date)
+        ordered = query.where(Event.recurrence.is_(None)).order_by(*order)
+        candidates = _event_results(
+            (await session.exec(query.where(Event.recurrence.is_not(None)))).all(), None, radius_km, from_date, to_date
+        )
+
+    keys, batch_offset, best = set(), 0, None
+    while len(keys) < top_k:
+        rows = (await session.exec(ordered.offset(batch_offset).limit(top_k))).all()
+        if ranked and rows and best is None:
+            # without an origin the rows are ordered by rank, so the first one is the best match
+            best = rows[0]._mapping.get("best_rank", rows[0].rank)
+        results = _event_results(rows, best, radius_km, from_date, to_date)
+        candidates += results
+        keys.update(map(_result_key, results))
+        if len(rows) < top_k:
+            break
+        batch_offset += top_k
+    return candidates
+
+
+def _event_results(
+    rows: list, best_rank: float | None, radius_km: float, from_date: datetime, to_date: datetime | None
+) -> list[SearchResult]:
+    results = []
+    for row in rows:
+        start_date = next_occurrence(row, from_date)
+        if start_date is None or (to_date is not None and start_date >= to_date):
+            continue
+
+        rank = row._mapping.get("rank")
+        relevance = rank / best_rank if rank is not None and best_rank else None
+        distance_km = row._mapping.get("distance_km")
+        results.append(
+            SearchResult(
+                cost=_cost(relevance, distance_km, radius_km, start_date, 0),
+                name=row.name,
+                start_date=start_date,
+                end_date=start_date + (row.end_date - row.start_date),
+                event_id=row.id,
+                rank=rank,
+                distance_km=distance_km,
+            )
+        )
+    return results
+
+
+def _cached_candidates(
+    q: str | None,
+    tags: list[str],
+    origin: tuple[float, float] | None,
+    radius_km: float,
+    from_date: datetime,
+    to_date: datetime | None,
+) -> list[SearchResult]:
+    if q is not None:
+        hits = search_index.search(q, tags)
+    elif tags:
+        hits = [(None, event, None) for tag in tags for event in search_index.events(tag)]
+    else:
+        hits = [(None, event, None) for event in search_index.all_events()]
+
+    today = from_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    candidates = []
+    for rank, event, snippet_source in hits:
+        start_date, end_date = event.occurrence(today)
+        # show only events that are in the future or today
+        if start_date < from_date or (to_date is not None and start_date >= to_date):
+            continue
+
+        distance_km = None
+        if origin is not None:
+            if event.latitude is None or event.longitude is None:
+                continue
+            distance_km = haversine_km(*origin, event.latitude, event.longitude)
+            if distance_km > radius_km:
+                continue
+
+        candidates.append(
+            SearchResult(
+                cost=(),
+                name=event.name,
+                start_date=start_date,
+                end_date=end_date,
+                event=event,
+                rank=rank,
+                snippet_source=snippet_source,
+                distance_km=distance_km,
+            )
+        )
+
+    # relative to the best match passing the filters like the relevance of the Event table, see _cost
+    best_rank = min((candidate.rank for candidate in candidates if candidate.rank is not None), default=None)
+    for candidate in candidates:
+        relevance = candidate.rank / best_rank if candidate.rank is not None and best_rank else None
+        candidate.cost = _cost(relevance, candidate.distance_km, radius_km, candidate.start_date, 1)
+    return candidates
@@ -5,12 +5,65 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
     # Database settings
-    database_url: str
+    database_url: str  # sqlite:// and postgresql:// URLs use the aiosqlite and asyncpg drivers
+    database_pool_size: int = 10
+    database_max_overflow: int = 20
+    database_pool_timeout: int = 30
+    database_pool_recycle: int = 1800
+
+    # SQLite settings, applied to every connection (WAL, a single writer and database_pool_size readers)
+    sqlite_synchronous: str = "NORMAL"  # durable in WAL mode except for the last commits on power loss
+    sqlite_mmap_size: int = 268435456  # 256 MiB
+    sqlite_cache_size: int = -65536  # negative values are KiB, 64 MiB per connection
+    sqlite_busy_timeout: int = 5000  # milliseconds, covers writers of other worker processes
+    sqlite_temp_store: str = "MEMORY"
 
     # OAuth2 settings
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
 
+    # Password hashing settings
+    bcrypt_rounds: int = 12  # changing it rehashes passwords on the next login
+    password_hash_workers: int = 4
+    password_hash_max_pending: int = 64  # more concurrent logins and registrations are rejected with 503
+
+    # Authenticated user cache settings, per worker process
+    principal_cache_size: int = 1024
+    principal_cache_seconds: int = 60
+
+    # Change notification settings
+    pubsub_queue_size: int = 256
+    sse_keepalive_seconds: int = 15
+
+    # Recurring event settings
+    occurrence_horizon_days: int = 90
+    occurrence_refresh_seconds: int = 3600
+
+    # Leaderboard settings
+    leaderboard_refresh_seconds: int = 3600  # interval of moving users to their new age band
+
+    # Health data settings
+    health_data_max_samples: int = 100000  # per request, larger syncs are split by the client
+    health_data_max_body_bytes: int = 33554432  # 32 MiB after decompression
+
+    # Activity goal settings
+    activity_goal_minutes: int = 150  # WHO recommendation of moderate activity per week
+    activity_plan_hour: int = 3  # sessions are planned once a night for the coming evening
+    activity_session_end_hour: int = 20
+    activity_session_min_minutes: int = 15
+    activity_session_max_minutes: int = 60  # for users without an intensity
+    activity_retention_weeks: int = 8
+
+    # Recommendation settings
+    recommendation_refresh_seconds: int = 30  # interval of reading the changed events into the index
+
+    # Search settings
+    search_results_path: str = "res/cached-search-results"
+    search_snapshot_path: str = "res/cached-search-results.snapshot"  # compiled by app.snapshot_helper
+    search_reload_seconds: int = 30
+    geocode_cache_size: int = 1024
+    geocode_cache_seconds: int = 86400  # also for unknown places, so they are not looked up on every search
+
 
 settings = Settings()
@@ -0,0 +1,266 @@
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+WEEKDAYS = {
+    "Monday": 0,
+    "Tuesday": 1,
+    "Wednesday": 2,
+    "Thursday": 3,
+    "Friday": 4,
+    "Saturday": 5,
+    "Sunday": 6,
+}
+
+# snapshot layout, every section starts at a multiple of 8 bytes:
+#   header
+#   start_date int64[events], end_date int64[events]  seconds since EPOCH, naive like the crawled dates
+#   latitude float32[events], longitude float32[events]  NaN when unknown
+#   name uint32[events], description uint32[events], url uint32[events]  index into the string table
+#   weekday int8[events]  -1 when not weekly
+#   tag name uint32[tags], first uint32[tags], last uint32[tags]  events of a tag are the range [first, last)
+#   tag source mtime int64[tags]
+#   string offsets uint32[strings + 1], string bytes (utf-8)
+MAGIC = b"LMSNAP01"
+HEADER = struct.Struct("<8s?3xIII")  # magic, little endian, event count, tag count, string count
+EPOCH = datetime(1970, 1, 1)
+NO_STRING = 0xFFFFFFFF
+
+
+@dataclass(slots=True)
+class CachedEvent:
+    """
+    Pre-parsed crawled event. Weekly events only store their weekday, the occurrence depends on the current day.
+    """
+
+    name: str
+    description: str | None
+    latitude: float | None
+    longitude: float | None
+    url: str | None
+    start_date: datetime | None
+    end_date: datetime | None
+    weekday: int | None = None
+
+    def occurrence(self, today: datetime) -> tuple[datetime, datetime]:
+        """
+        Start and end of the event, for weekly events the next occurrence of the weekday from today (midnight)
+        """
+        if self.weekday is None:
+            return self.start_date, self.end_date
+        next_occurrence = today + timedelta(days=(self.weekday - today.weekday()) % 7)
+        return next_occurrence, next_occurrence
+
+    @classmethod
+    def from_json(cls, event: dict) -> "CachedEvent":
+        # weekly events save the day of the week in the start_date, for example "Friday 18:00"
+        weekday = WEEKDAYS.get(event["start_date"].split(" ")[0]) if event.get("weekly") else None
+        return cls(
+            name=event["name"],
+            description=event.get("description"),
+            latitude=event.get("latitude"),
+            longitude=event.get("longitude"),
+            url=event.get("url"),
+            start_date=None if weekday is not None else datetime.fromisoformat(event["start_date"]),
+            end_date=None if weekday is not None else datetime.fromisoformat(event["end_date"]),
+            weekday=weekday,
+        )
+
+
+def read_cached_events(path: str) -> list[CachedEvent]:
+    """
+    Parse a JSON file written by crawl.py, invalid events are skipped
+    """
+    with open(path, "r") as f:
+        events = json.load(f)
+
+    parsed = []
+    for event in events:
+        try:
+            parsed.append(CachedEvent.from_json(event))
+        except (KeyError, ValueError) as e:
+            logging.warning(f"skipping invalid cached search result in {path}: {e}")
+    return parsed
+
+
+def compile_snapshot(source_path: str, snapshot_path: str):
+    """
+    Compile the JSON files of source_path (one per tag) into a snapshot. The file is replaced atomically,
+    so processes still mapping the previous snapshot keep reading a consistent copy.
+    """
+    strings: dict[str, int] = {}
+
+    def intern(value: str | None) -> int:
+        if value is None:
+            return NO_STRING
+        return strings.setdefault(value, len(strings))
+
+    start_dates, end_dates = array("q"), array("q")
+    latitudes, longitudes = array("f"), array("f")
+    names, descriptions, urls = array("I"), array("I"), array("I")
+    weekdays = array("b")
+    tag_names, tag_firsts, tag_lasts, tag_mtimes = array("I"), array("I"), array("I"), array("q")
+
+    for entry in sorted(os.scandir(source_path), key=lambda entry: entry.name):
+        tag, extension = os.path.splitext(entry.name)
+        if extension != ".json":
+            continue
+
+        tag_names.append(intern(tag))
+        tag_firsts.append(len(names))
+        tag_mtimes.append(entry.stat().st_mtime_ns)
+        for event in read_cached_events(entry.path):
+            start_dates.append(_epoch_seconds(event.start_date))
+            end_dates.append(_epoch_seconds(event.end_date))
+            latitudes.append(float("nan") if event.latitude is None else event.latitude)
+            longitudes.append(float("nan") if event.longitude is None else event.longitude)
+            names.append(intern(event.name))
+            descriptions.append(intern(event.description))
+            urls.append(intern(event.url))
+            weekdays.append(-1 if event.weekday is None else event.weekday)
+        tag_lasts.append(len(names))
+
+    encoded = [value.encode() for value in strings]
+    string_offsets = array("I", [0])
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    sections = [
+        start_dates,
+        end_dates,
+        latitudes,
+        longitudes,
+        names,
+        descriptions,
+        urls,
+        weekdays,
+        tag_names,
+        tag_firsts,
+        tag_lasts,
+        tag_mtimes,
+        string_offsets,
+    ]
+    temporary_path = f"{snapshot_path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, sys.byteorder == "little", len(names), len(tag_names), len(strings)))
+        for section in sections:
+            _pad(f)
+            f.write(section.tobytes())
+        _pad(f)
+        f.write(b"".join(encoded))
+    os.replace(temporary_path, snapshot_path)
+
+    logging.info(f"compiled {len(names)} cached search results of {len(tag_names)} tags into {snapshot_path}")
+
+
+class Snapshot:
+    """
+    Read-only view of a compiled snapshot. The file is memory-mapped, so all workers share the same pages
+    and events are only decoded when accessed.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, little_endian, event_count, tag_count, string_count = HEADER.unpack_from(view)
+        if magic != MAGIC or little_endian != (sys.byteorder == "little"):
+            raise ValueError(f"{path} is not a snapshot of this version and byte order")
+
+        offset = HEADER.size
+
+        def section(format: str, count: int) -> memoryview:
+            nonlocal offset
+            offset += -offset % 8
+            size = struct.calcsize(format) * count
+            column = view[offset : offset + size].cast(format)
+            offset += size
+            return column
+
+        self.start_dates = section("q", event_count)
+        self.end_dates = section("q", event_count)
+        self.latitudes = section("f", event_count)
+        self.longitudes = section("f", event_count)
+        self._names = section("I", event_count)
+        self._descriptions = section("I", event_count)
+        self._urls = section("I", event_count)
+        self.weekdays = section("b", event_count)
+        tag_names = section("I", tag_count)
+        tag_firsts = section("I", tag_count)
+        tag_lasts = section("I", tag_count)
+        tag_mtimes = section("q", tag_count)
+        self._string_offsets = section("I", string_count + 1)
+        offset += -offset % 8
+        self._strings = view[offset:]
+
+        self.tags: dict[str, tuple[int, range]] = {
+            self.string(tag_names[i]): (tag_mtimes[i], range(tag_firsts[i], tag_lasts[i])) for i in range(tag_count)
+        }
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def string(self, index: int) -> str | None:
+        if index == NO_STRING:
+            return None
+        return str(self._strings[self._string_offsets[index] : self._string_offsets[index + 1]], "utf-8")
+
+    def event(self, position: int) -> CachedEvent:
+        weekday = self.weekdays[position]
+        latitude, longitude = self.latitudes[position], self.longitudes[position]
+        return CachedEvent(
+            name=self.string(self._names[position]),
+            description=self.string(self._descriptions[position]),
+            latitude=None if latitude != latitude else latitude,
+            longitude=None if longitude != longitude else longitude,
+            url=self.string(self._urls[position]),
+            start_date=None if weekday >= 0 else EPOCH + timedelta(seconds=self.start_dates[position]),
+            end_date=None if weekday >= 0 else EPOCH + timedelta(seconds=self.end_dates[position]),
+            weekday=None if weekday < 0 else weekday,
+        )
+
+
+class SnapshotEvents(Sequence):
+    """
+    Events of one tag in a snapshot, decoded on access
+    """
+
+    def __init__(self, snapshot: Snapshot, positions: range):
+        self._snapshot = snapshot
+        self._positions = positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, index: int) -> CachedEvent:
+        return self._snapshot.event(self._positions[index])
+
+
+def _epoch_seconds(value: datetime | None) -> int:
+    if value is None:
+        return 0
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return int((value - EPOCH).total_seconds())
+
+
+def _pad(f):
+    f.write(b"\0" * (-f.tell() % 8))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Compile the crawled search results into a snapshot")
+    parser.add_argument("source", nargs="?", default="res/cached-search-results")
+    parser.add_argument("snapshot", nargs="?", default="res/cached-search-results.snapshot")
+    args = parser.parse_args()
+    compile_snapshot(args.source, args.snapshot)
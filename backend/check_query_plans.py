@@ -0,0 +1,180 @@
+"""
+Run EXPLAIN QUERY PLAN on the queries of the API routes and fail when a hot query scans a table.
+
+The routes are called on a new SQLite database migrated to the latest revision with the mock data.
+Every statement they execute is recorded and explained with the same parameters.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import warnings
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+database_path = os.path.join(tempfile.mkdtemp(), "query-plans.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.app import app  # noqa: E402
+from app.database import engine, read_engine  # noqa: E402
+from app.pagination_helper import NEXT_CURSOR_HEADER, encode_cursor  # noqa: E402
+from seed import seed  # noqa: E402
+
+# tables or indexes a route reads completely by design, keyed by route
+FULL_SCANS = {
+    "GET /tags": {"tag"},
+    # the event count of the validators, so deletions change them, reads the narrowest index of event
+    "GET /events": {"ix_event_updated_at"},
+    "GET /search": {"ix_event_updated_at"},
+}
+
+# SCAN rows, with or without alias or index, except constant rows, materialized subqueries and FTS lookups
+SCAN = re.compile(r"SCAN\b")
+NOT_A_TABLE_SCAN = re.compile(r"SCAN (CONSTANT ROW|\(subquery-\d+\)|\w+ VIRTUAL TABLE INDEX \d+:M)")
+
+current_route: str | None = None
+statements: dict[str, list[tuple[str, tuple]]] = {}
+
+
+def _record(connection, cursor, statement, parameters, context, executemany):
+    if (
+        current_route is None
+        or executemany
+        or not statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE"))
+    ):
+        return
+    statements.setdefault(current_route, []).append((statement, tuple(parameters or ())))
+
+
+event.listen(engine.sync_engine, "before_cursor_execute", _record)
+event.listen(read_engine.sync_engine, "before_cursor_execute", _record)
+
+
+@contextmanager
+def route(name: str):
+    global current_route
+    current_route = name
+    try:
+        yield
+    finally:
+        current_route = None
+
+
+def call_routes(client: TestClient):
+    """
+    Call every route that queries the database, at least once with each of its query variants
+    """
+    now = datetime.now()
+    event_body = {
+        "name": "Query plan check",
+        "description": "Event created by check_query_plans.py",
+        "organiser_type": "individual",
+        "latitude": 49.45,
+        "longitude": 11.08,
+        "start_date": (now + timedelta(days=1)).isoformat(),
+        "end_date": (now + timedelta(days=1, hours=1)).isoformat(),
+    }
+
+    def call(name: str, method: str, path: str, **kwargs):
+        with route(name):
+            response = client.request(method, path, **kwargs)
+        if response.is_error:
+            raise RuntimeError(f"{method} {path} failed with {response.status_code}: {response.text}")
+        return response
+
+    token = call("POST /token", "POST", "/token", data={"username": "user@user.de", "password": "user"})
+    headers = {"Authorization": f"Bearer {token.json()['access_token']}"}
+    registration = {"email": "plan@check.de", "username": "plan", "birthday": now.isoformat(), "intensity": 30}
+    call("POST /register", "POST", "/register", json=registration | {"tags": ["yoga"]})
+
+    event_id = call("POST /events", "POST", "/events", json=event_body).json()["id"]
+    call("POST /events/bulk", "POST", "/events/bulk", content=json.dumps(event_body | {"tags": ["yoga"]}))
+    for path in ["/events", "/events/occurrences"]:
+        cursor = call(f"GET {path}", "GET", path, params={"limit": 1}).headers[NEXT_CURSOR_HEADER]
+        call(f"GET {path}", "GET", path, params={"limit": 1, "cursor": cursor})
+    call("GET /events/nearby", "GET", "/events/nearby", params={"lat": 49.45, "lon": 11.08, "radius_km": 10})
+    call("GET /events/{event_id}", "GET", f"/events/{event_id}", headers=headers)
+    call("PUT /events/{event_id}/participate", "PUT", f"/events/{event_id}/participate", headers=headers)
+    call("DELETE /events/{event_id}/leave", "DELETE", f"/events/{event_id}/leave", headers=headers)
+
+    call("GET /tags", "GET", "/tags")
+    call("GET /tags/{tag_id}", "GET", "/tags/1")
+    call("POST /tags", "POST", "/tags", json={"name": "Query plan check"})
+
+    call("GET /users/me", "GET", "/users/me", headers=headers)
+    call("GET /users/me/activity", "GET", "/users/me/activity", headers=headers)
+    for params in [{}, {"lat": 49.45, "lon": 11.08}]:
+        call("GET /users/me/recommendations", "GET", "/users/me/recommendations", headers=headers, params=params)
+        call("GET /users/me/plan", "GET", "/users/me/plan", headers=headers, params=params)
+    call("GET /users/me/events", "GET", "/users/me/events", headers=headers)
+    for params in [{"status": "upcoming", "from": now.isoformat()}, {"status": "past", "to": now.isoformat()}]:
+        cursor = encode_cursor(now, event_id)
+        call("GET /users/me/events", "GET", "/users/me/events", headers=headers, params=params | {"cursor": cursor})
+    cursor = call("GET /users/leaderboard", "GET", "/users/leaderboard", params={"limit": 1}).headers[
+        NEXT_CURSOR_HEADER
+    ]
+    call("GET /users/leaderboard", "GET", "/users/leaderboard", params={"limit": 1, "cursor": cursor})
+    call("GET /users/leaderboard", "GET", "/users/leaderboard", params={"offset": 2})
+    call("GET /users/leaderboard", "GET", "/users/leaderboard", params={"tag": "yoga", "age_band": "under-18"})
+    call("GET /users/me/leaderboard", "GET", "/users/me/leaderboard", headers=headers)
+
+    samples = [
+        {"data_type": "steps", "data": 100 * hour, "date": (now - timedelta(hours=hour)).isoformat()}
+        for hour in range(3)
+    ]
+    ndjson = gzip.compress("\n".join(map(json.dumps, samples)).encode())
+    headers_gzip = headers | {"Content-Encoding": "gzip"}
+    call("POST /users/me/health-data", "POST", "/users/me/health-data", headers=headers_gzip, content=ndjson)
+    columns = {key: [sample[key] for sample in samples] for key in ["data_type", "data", "date"]}
+    call("POST /users/me/health-data", "POST", "/users/me/health-data", headers=headers, json=columns)
+    for resolution in ["hourly", "daily"]:
+        path = f"/users/me/health-data/{resolution}"
+        call("GET /users/me/health-data/{resolution}", "GET", path, headers=headers, params={"data_type": ["steps"]})
+
+    call("GET /search", "GET", "/search", params={"q": "yoga", "tags": ["yoga"], "location": "49.45,11.08"})
+    call("GET /search", "GET", "/search", params={"tags": ["yoga"]})
+    call("GET /search", "GET", "/search", params={"q": "yoga"})
+
+
+def full_scans(connection: sqlite3.Connection, statement: str, parameters: tuple, allowed: set[str]) -> set[str]:
+    plan = connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    return {
+        detail
+        for _, _, _, detail in plan
+        if SCAN.match(detail) and not NOT_A_TABLE_SCAN.match(detail) and not allowed & set(detail.split())
+    }
+
+
+def main() -> int:
+    warnings.filterwarnings("ignore")
+    asyncio.run(seed())
+    with TestClient(app) as client:
+        call_routes(client)
+
+    failures = 0
+    connection = sqlite3.connect(database_path)
+    for name, route_statements in statements.items():
+        for statement, parameters in dict.fromkeys(route_statements):
+            scanned = full_scans(connection, statement, parameters, FULL_SCANS.get(name, set()))
+            if scanned:
+                failures += 1
+                print(f"{name} runs {', '.join(sorted(scanned))}:\n{statement}\n", file=sys.stderr)
+    connection.close()
+
+    checked = sum(len(set(route_statements)) for route_statements in statements.values())
+    print(f"checked the query plans of {checked} queries of {len(statements)} routes, {failures} table scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
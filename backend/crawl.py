@@ -1,8 +1,11 @@
+import argparse
 import asyncio
 import json
 import logging
+import os
 import re
 import time
+from datetime import datetime
 from functools import lru_cache
 from uuid import uuid4
 
@@ -13,11 +16,16 @@ from geopy.exc import GeocoderTimedOut
 from geopy.geocoders import Nominatim
 from googlesearch import search
 
+from app.snapshot_helper import compile_snapshot
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
 model = "gemma3:12b-it-qat"
 
+search_results_path = "res/cached-search-results"
+search_snapshot_path = "res/cached-search-results.snapshot"
+
 
 async def extract_text_from_url_async(url: str, session: aiohttp.ClientSession) -> str:
     try:
@@ -202,11 +210,10 @@ async def aggregate_event_data_async(query: str, content: list[str], ollama_clie
     return summary
 
 
-async def main_async():
+async def main_async(tag: str, query: str):
     """
     Main asynchronous function to perform search and process results.
     """
-    query = "Yoga in Nürnberg 2025"
     logging.info(f"Performing Google search for: {query}")
 
     urls = []
@@ -248,6 +255,20 @@ async def main_async():
     print("Aggregated events:")
     print(json.dumps(aggregated_events))
 
+    # the API serves the compiled snapshot, so compile it again with the new results of the tag
+    with open(f"{search_results_path}/{tag}.json", "w") as f:
+        json.dump(aggregated_events, f, indent=4)
+    compile_snapshot(search_results_path, search_snapshot_path)
+
 
 if __name__ == "__main__":
-    asyncio.run(main_async())
+    parser = argparse.ArgumentParser(description="Crawl events of a tag into the cached search results")
+    parser.add_argument("tag", help="tag the crawled events are stored under")
+    parser.add_argument("--query", help="Google search query, defaults to the tag in Nürnberg this year")
+    parser.add_argument("--replace", action="store_true", help="replace the existing cached search results of the tag")
+    args = parser.parse_args()
+
+    # the cached search results may be curated by hand, only replace them when asked to
+    if os.path.exists(f"{search_results_path}/{args.tag}.json") and not args.replace:
+        parser.error(f"{search_results_path}/{args.tag}.json exists, pass --replace to overwrite it")
+    asyncio.run(main_async(args.tag, args.query or f"{args.tag.capitalize()} in Nürnberg {datetime.now().year}"))
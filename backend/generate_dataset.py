@@ -0,0 +1,506 @@
+"""
+Generate a large synthetic dataset for load testing. The same seed and reference date always produce the same rows.
+
+Users and events are clustered around cities by population, participations prefer popular events in the home city
+of the user and tags follow a Zipf distribution. Rows are written with raw executemany (SQLite) or COPY (PostgreSQL)
+and ids are assigned here, so they are appended after the existing rows without reading them back.
+"""
+
+import argparse
+import asyncio
+import logging
+import math
+import random
+import time
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timedelta
+from itertools import accumulate, batched
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.activity_helper import rebuild_weekly_activity
+from app.database import engine, read_engine
+from app.geo_helper import KM_PER_DEGREE_LATITUDE, grid_cell
+from app.health_data_helper import rebuild_health_rollups
+from app.leaderboard_helper import rebuild_leaderboard
+from app.migration_helper import upgrade_database
+from app.models import EventOrganiserType, EventParticipationType, HealthDataType
+from app.occurrence_helper import extend_occurrences
+
+# name, latitude, longitude, population in thousands
+CITIES = [
+    ("Berlin", 52.520, 13.405, 3755),
+    ("Hamburg", 53.551, 9.994, 1892),
+    ("München", 48.137, 11.576, 1512),
+    ("Köln", 50.938, 6.960, 1084),
+    ("Frankfurt am Main", 50.111, 8.682, 773),
+    ("Stuttgart", 48.776, 9.183, 633),
+    ("Düsseldorf", 51.228, 6.774, 629),
+    ("Leipzig", 51.340, 12.375, 616),
+    ("Dortmund", 51.514, 7.466, 595),
+    ("Essen", 51.456, 7.012, 584),
+    ("Bremen", 53.079, 8.802, 577),
+    ("Dresden", 51.050, 13.738, 563),
+    ("Hannover", 52.376, 9.732, 548),
+    ("Nürnberg", 49.452, 11.077, 526),
+    ("Duisburg", 51.435, 6.763, 502),
+    ("Bochum", 51.482, 7.216, 365),
+    ("Wuppertal", 51.256, 7.151, 358),
+    ("Bielefeld", 52.030, 8.532, 335),
+    ("Bonn", 50.737, 7.098, 336),
+    ("Münster", 51.960, 7.626, 320),
+    ("Augsburg", 48.370, 10.898, 301),
+    ("Regensburg", 49.013, 12.101, 157),
+    ("Erlangen", 49.598, 11.004, 117),
+    ("Würzburg", 49.791, 9.953, 128),
+]
+
+# ordered by popularity, tags missing in the database are created
+TAGS = [
+    ("running", "🏃"),
+    ("cycling", "🚴"),
+    ("soccer", "⚽"),
+    ("yoga", "🧘"),
+    ("hiking", "🥾"),
+    ("swimming", "🏊"),
+    ("fitness", "🏋"),
+    ("badminton", "🏸"),
+    ("basketball", "🏀"),
+    ("volleyball", "🏐"),
+    ("pilates", "🤸"),
+    ("tennis", "🎾"),
+    ("table tennis", "🏓"),
+    ("climbing", "🧗"),
+    ("rowing", "🚣"),
+    ("dancing", "💃"),
+    ("martial arts", "🥋"),
+    ("skating", "⛸"),
+    ("handball", "🤾"),
+    ("golf", "⛳"),
+]
+
+EVENT_NAMES = ["Morning", "Evening", "Weekend", "After Work", "Beginner", "Advanced", "Open", "Community", "Charity"]
+EVENT_KINDS = ["Run", "Ride", "Match", "Class", "Session", "Meetup", "Tour", "Training", "Challenge", "Workshop"]
+
+# bcrypt hash of "password", all generated users share it
+PASSWORD_HASH = "$2b$12$PlZTHPtc6YbgfJiknAbXsOQc4Z.Orkz4qn6ub9vUfClyMf57QRWze"
+
+# share of the activity of a day per hour, for hourly health samples
+HOURLY_ACTIVITY = [
+    0.2,
+    0.1,
+    0.1,
+    0.1,
+    0.2,
+    0.5,
+    1.5,
+    2.5,
+    2,
+    1.5,
+    1.5,
+    2,
+    2.5,
+    2,
+    1.5,
+    1.5,
+    2,
+    3,
+    3.5,
+    2.5,
+    1.5,
+    1,
+    0.6,
+    0.3,
+]
+
+
+class DatasetGenerator:
+    """
+    Deterministic rows of every table. Each table has its own random stream, so changing the volume of one table
+    does not change the rows of the others.
+    """
+
+    def __init__(self, seed: int, reference_date: datetime):
+        self.seed = seed
+        self.reference_date = reference_date
+        self.city_weights = list(accumulate(population for *_, population in CITIES))
+
+    def stream(self, table: str) -> random.Random:
+        return random.Random(f"{self.seed}:{table}")
+
+    @staticmethod
+    def zipf_weights(count: int, exponent: float) -> list[float]:
+        return list(accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+    def location(self, rng: random.Random, city: int, spread_km: float) -> tuple[float, float]:
+        _, latitude, longitude, _ = CITIES[city]
+        distance = abs(rng.gauss(0, spread_km)) / KM_PER_DEGREE_LATITUDE
+        angle = rng.uniform(0, 2 * math.pi)
+        return (
+            latitude + distance * math.sin(angle),
+            longitude + distance * math.cos(angle) / math.cos(math.radians(latitude)),
+        )
+
+    def cities(self, table: str, count: int) -> list[int]:
+        return self.stream(f"{table}:city").choices(range(len(CITIES)), cum_weights=self.city_weights, k=count)
+
+    def users(self, first_id: int, cities: list[int]) -> Iterator[tuple]:
+        rng = self.stream("user")
+        for offset, city in enumerate(cities):
+            user_id = first_id + offset
+            age = min(90, max(14, round(rng.gauss(36, 13))))
+            birthday = self.reference_date - timedelta(days=age * 365 + rng.randrange(365))
+            yield (
+                user_id,
+                f"user{user_id}@example.com",
+                f"{CITIES[city][0]} User {user_id}",
+                PASSWORD_HASH,
+                round(rng.expovariate(1 / 1.5), 2),  # level
+                int(rng.expovariate(1 / 40)),  # bonus_points
+                birthday,
+                rng.choice([15, 30, 30, 45, 60, 60, 90, 120]),  # intensity
+            )
+
+    def events(self, first_id: int, cities: list[int]) -> Iterator[tuple]:
+        rng = self.stream("event")
+        organiser_types = list(EventOrganiserType)
+        for offset, city in enumerate(cities):
+            latitude, longitude = self.location(rng, city, spread_km=8)
+            # a third in the past, the rest spread over the next half year
+            start_date = self.reference_date + timedelta(minutes=15 * rng.randrange(-60 * 96, 180 * 96))
+            duration = timedelta(minutes=rng.choice([30, 45, 60, 60, 90, 120, 180, 240]))
+            weekly = rng.random() < 0.05
+            name = f"{rng.choice(EVENT_NAMES)} {rng.choice(EVENT_KINDS)} {CITIES[city][0]}"
+            yield (
+                first_id + offset,
+                name,
+                f"{name}, generated for load testing",
+                rng.choice(organiser_types).name,
+                latitude,
+                longitude,
+                None,  # url
+                rng.choice([None, None, None, 10, 20, 50, 200]),  # max_participants
+                rng.choice([0, 0, 5, 10, 20]),  # bonus_points
+                start_date,
+                start_date + duration,
+                "weekly" if weekly else None,
+                start_date + timedelta(weeks=rng.randrange(4, 52)) if weekly and rng.random() < 0.5 else None,
+                self.reference_date,  # created_at
+                self.reference_date,  # updated_at
+                0,  # participant_count, counted after the participations are loaded
+                grid_cell(latitude, longitude),
+            )
+
+    def occurrences(self, first_id: int, events: Iterable[tuple]) -> Iterator[tuple]:
+        one_off = (event for event in events if event[11] is None)
+        for occurrence_id, event in enumerate(one_off, first_id):
+            yield occurrence_id, event[0], event[9], event[10]
+
+    def tag_links(self, table: str, owner_ids: range, tag_ids: list[int], links_per_owner: float) -> Iterator[tuple]:
+        rng = self.stream(table)
+        weights = self.zipf_weights(len(tag_ids), exponent=1.1)
+        for owner_id in owner_ids:
+            count = min(len(tag_ids), 1 + int(rng.expovariate(1 / max(links_per_owner - 1, 0.01))))
+            for tag_id in sorted(set(rng.choices(tag_ids, cum_weights=weights, k=count))):
+                yield owner_id, tag_id
+
+    def participations(
+        self,
+        user_ids: range,
+        user_cities: list[int],
+        event_ids: range,
+        event_cities: list[int],
+        max_participants: list[int | None],
+        count: int,
+    ) -> Iterator[tuple]:
+        rng = self.stream("eventuserlink")
+        if not event_ids or not user_ids:
+            return
+        # free seats of the limited events, none or 0 means unlimited like in the join route
+        seats = {event_id: limit for event_id, limit in zip(event_ids, max_participants) if limit and limit > 0}
+
+        # popularity is independent of the id, the events of a city are shuffled before ranking them
+        events_by_city: list[list[int]] = [[] for _ in CITIES]
+        for event_id, city in zip(event_ids, event_cities):
+            events_by_city[city].append(event_id)
+        everywhere = list(event_ids)
+        for events in [*events_by_city, everywhere]:
+            rng.shuffle(events)
+        weights_by_city = [self.zipf_weights(len(events), exponent=0.9) for events in events_by_city]
+        weights_everywhere = self.zipf_weights(len(everywhere), exponent=0.9)
+
+        # a few heavy users join many events, most join few
+        activity = [rng.expovariate(1) for _ in user_ids]
+        scale = count / sum(activity)
+        participation_types = list(EventParticipationType)
+        for user_id, city, user_activity in zip(user_ids, user_cities, activity):
+            joined = set()
+            wanted = min(len(everywhere), round(user_activity * scale))
+            # popular events are drawn several times and fill up, draw again for the duplicates and full events
+            for _ in range(10):
+                missing = wanted - len(joined)
+                if missing <= 0:
+                    break
+                local = sum(rng.random() < 0.8 for _ in range(missing)) if events_by_city[city] else 0
+                drawn = rng.choices(everywhere, cum_weights=weights_everywhere, k=missing - local)
+                if local:
+                    drawn += rng.choices(events_by_city[city], cum_weights=weights_by_city[city], k=local)
+                for event_id in drawn:
+                    if event_id in joined or seats.get(event_id, 1) <= 0:
+                        continue
+                    if event_id in seats:
+                        seats[event_id] -= 1
+                    joined.add(event_id)
+            for event_id in sorted(joined):
+                participation_type = rng.choice(participation_types)
+                participated = participation_type == EventParticipationType.participated
+                yield (
+                    event_id,
+                    user_id,
+                    participation_type.name,
+                    self.reference_date if participated else None,
+                    rng.randrange(1, 101) if participated else None,
+                )
+
+    def health_samples(self, user_ids: range, count: int) -> Iterator[tuple]:
+        # hourly samples of every type going back from the reference date, unique per user, type and hour
+        rng = self.stream("userhealthdata")
+        if not user_ids:
+            return
+        data_types = list(HealthDataType)
+        hours_per_user, remainder = divmod(count // len(data_types), len(user_ids))
+        for index, user_id in enumerate(user_ids):
+            fitness = rng.lognormvariate(0, 0.4)
+            hours = hours_per_user + (1 if index < remainder else 0)
+            for hour in range(hours):
+                date = self.reference_date - timedelta(hours=hour + 1)
+                steps = int(rng.expovariate(1 / 350) * HOURLY_ACTIVITY[date.hour] * fitness)
+                for data_type, data in zip(data_types, [steps, int(steps * 0.75), int(steps * 0.04)]):
+                    yield data_type.name, data, date, user_id
+
+
+class BulkLoader:
+    """
+    Write rows with the fastest path of the database, one transaction per batch
+    """
+
+    def __init__(self, connection: AsyncConnection, batch_size: int):
+        self.connection = connection
+        self.batch_size = batch_size
+
+    async def next_id(self, table: str) -> int:
+        table = SQLModel.metadata.tables[table]
+        async with self.connection.begin():
+            return ((await self.connection.execute(select(func.max(table.c.id)))).scalar() or 0) + 1
+
+    async def load(self, table: str, columns: list[str], rows: Iterable[tuple]) -> int:
+        dialect = self.connection.dialect
+        # convert values like the ORM does, e.g. datetimes are strings on SQLite
+        types = [SQLModel.metadata.tables[table].c[column].type.dialect_impl(dialect) for column in columns]
+        processors = [column_type.bind_processor(dialect) for column_type in types]
+        processors = [(index, processor) for index, processor in enumerate(processors) if processor]
+        quoted = ", ".join(dialect.identifier_preparer.quote(column) for column in columns)
+        placeholders = ", ".join("?" * len(columns))
+        statement = f"INSERT INTO {dialect.identifier_preparer.quote(table)} ({quoted}) VALUES ({placeholders})"
+
+        started, loaded = time.perf_counter(), 0
+        for batch in batched(rows, self.batch_size):
+            if processors:
+                batch = [list(row) for row in batch]
+                for row in batch:
+                    for index, processor in processors:
+                        row[index] = processor(row[index])
+            async with self.connection.begin():
+                driver_connection = (await self.connection.get_raw_connection()).driver_connection
+                if dialect.name == "postgresql":
+                    await driver_connection.copy_records_to_table(table, columns=columns, records=batch)
+                else:
+                    await driver_connection.executemany(statement, batch)
+            loaded += len(batch)
+        elapsed = time.perf_counter() - started
+        logging.info(f"loaded {loaded} rows into {table} in {elapsed:.1f} s ({loaded / max(elapsed, 1e-9):.0f}/s)")
+        return loaded
+
+    async def reset_sequence(self, table: str):
+        # ids were assigned by the generator, so the sequence has to continue after them
+        if self.connection.dialect.name == "postgresql":
+            async with self.connection.begin():
+                await self.connection.execute(
+                    text(
+                        f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT max(id) FROM \"{table}\"))"
+                    )
+                )
+
+
+async def ensure_tags(connection: AsyncConnection) -> list[int]:
+    """
+    Ids of the generated tags ordered by popularity, missing tags are created
+    """
+    tag = SQLModel.metadata.tables["tag"]
+    async with connection.begin():
+        existing = dict((await connection.execute(select(tag.c.name, tag.c.id))).all())
+        missing = [{"name": name, "emoji": emoji} for name, emoji in TAGS if name not in existing]
+        if missing:
+            await connection.execute(tag.insert(), missing)
+            existing = dict((await connection.execute(select(tag.c.name, tag.c.id))).all())
+    return [existing[name] for name, _ in TAGS]
+
+
+async def generate(
+    seed: int,
+    reference_date: datetime,
+    users: int,
+    events: int,
+    participations: int,
+    user_tags: float,
+    event_tags: float,
+    health_samples: int,
+    batch_size: int,
+):
+    """
+    Migrate the database and append the generated rows to it
+    """
+    generator = DatasetGenerator(seed, reference_date)
+    try:
+        await upgrade_database()
+        async with engine.connect() as connection:
+            loader = BulkLoader(connection, batch_size)
+            tag_ids = await ensure_tags(connection)
+
+            first_user_id = await loader.next_id("user")
+            user_ids = range(first_user_id, first_user_id + users)
+            user_cities = generator.cities("user", users)
+            await loader.load(
+                "user",
+                ["id", "email", "username", "hashed_password", "level", "bonus_points", "birthday", "intensity"],
+                generator.users(first_user_id, user_cities),
+            )
+
+            first_event_id = await loader.next_id("event")
+            event_ids = range(first_event_id, first_event_id + events)
+            event_cities = generator.cities("event", events)
+            event_columns = [
+                "id",
+                "name",
+                "description",
+                "organiser_type",
+                "latitude",
+                "longitude",
+                "url",
+                "max_participants",
+                "bonus_points",
+                "start_date",
+                "end_date",
+                "recurrence",
+                "recurrence_until",
+                "created_at",
+                "updated_at",
+                "participant_count",
+                "geo_cell",
+            ]
+            await loader.load("event", event_columns, generator.events(first_event_id, event_cities))
+            # one-off events have a single occurrence, weekly ones are materialized below like the occurrence job does
+            first_occurrence_id = await loader.next_id("eventoccurrence")
+            await loader.load(
+                "eventoccurrence",
+                ["id", "event_id", "start_date", "end_date"],
+                generator.occurrences(first_occurrence_id, generator.events(first_event_id, event_cities)),
+            )
+            await loader.load(
+                "usertaglink", ["user_id", "tag_id"], generator.tag_links("usertaglink", user_ids, tag_ids, user_tags)
+            )
+            await loader.load(
+                "eventtaglink",
+                ["event_id", "tag_id"],
+                generator.tag_links("eventtaglink", event_ids, tag_ids, event_tags),
+            )
+            await loader.load(
+                "eventuserlink",
+                ["event_id", "user_id", "participation_type", "date", "score"],
+                generator.participations(
+                    user_ids,
+                    user_cities,
+                    event_ids,
+                    event_cities,
+                    [event[7] for event in generator.events(first_event_id, event_cities)],
+                    participations,
+                ),
+            )
+            await loader.load(
+                "userhealthdata",
+                ["data_type", "data", "date", "user_id"],
+                generator.health_samples(user_ids, health_samples),
+            )
+
+            async with connection.begin():
+                await connection.execute(
+                    text(
+                        "UPDATE event SET participant_count = "
+                        "(SELECT count(*) FROM eventuserlink WHERE eventuserlink.event_id = event.id) "
+                        "WHERE id BETWEEN :first AND :last"
+                    ),
+                    {"first": first_event_id, "last": first_event_id + events - 1},
+                )
+            for table in ["user", "event", "eventoccurrence"]:
+                await loader.reset_sequence(table)
+
+            # the raw inserts bypass the flush hook that keeps the leaderboards in sync
+            started = time.perf_counter()
+            async with connection.begin():
+                await connection.run_sync(rebuild_leaderboard)
+            logging.info(f"rebuilt the leaderboards in {time.perf_counter() - started:.1f} s")
+
+            # and the ingestion that keeps the health data rollups in sync
+            started = time.perf_counter()
+            async with connection.begin():
+                await connection.run_sync(rebuild_health_rollups)
+            logging.info(f"rebuilt the health data rollups in {time.perf_counter() - started:.1f} s")
+
+            # and the routes that keep the weekly activity in sync, which is summed from the rollups
+            started = time.perf_counter()
+            async with connection.begin():
+                await connection.run_sync(rebuild_weekly_activity)
+            logging.info(f"rebuilt the weekly activity in {time.perf_counter() - started:.1f} s")
+
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            created = await extend_occurrences(session)
+        logging.info(f"materialized {created} occurrences of weekly events")
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset for load testing")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--reference-date",
+        type=datetime.fromisoformat,
+        default=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0),
+        help="events are scheduled and health samples recorded around this date, defaults to today",
+    )
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--participations", type=int, default=2_000_000)
+    parser.add_argument("--user-tags", type=float, default=3, help="average number of tags per user")
+    parser.add_argument("--event-tags", type=float, default=2, help="average number of tags per event")
+    parser.add_argument("--health-samples", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=50_000, help="rows per transaction")
+    args = parser.parse_args()
+    asyncio.run(
+        generate(
+            args.seed,
+            args.reference_date,
+            args.users,
+            args.events,
+            args.participations,
+            args.user_tags,
+            args.event_tags,
+            args.health_samples,
+            args.batch_size,
+        )
+    )
@@ -1,4 +1,10 @@
+import asyncio
+
 import uvicorn
 
+from seed import seed
+
 if __name__ == "__main__":
+    # once before starting, reloads only verify the schema
+    asyncio.run(seed())
     uvicorn.run("app.app:app", host="0.0.0.0", port=8000, reload=True, log_config="log_conf.yml")
@@ -0,0 +1,147 @@
+"""
+Schema changes of the event features added before migrations: recurrence and materialized occurrences,
+participant counter, grid cell, keyword search (SQLite only), event list and user email indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:37:07.367516
+"""
+
+import math
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+# the grid of geo_helper at this revision, frozen so the stored cells do not change with it
+GRID_CELL_DEGREES = 0.1
+GRID_COLUMNS = round(360 / GRID_CELL_DEGREES)
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+
+
+def grid_cell(latitude: float, longitude: float) -> int:
+    row = min(GRID_ROWS - 1, max(0, math.floor((latitude + 90) / GRID_CELL_DEGREES)))
+    column = math.floor((longitude + 180) / GRID_CELL_DEGREES) % GRID_COLUMNS
+    return row * GRID_COLUMNS + column
+
+
+# keyword search index over name and description, kept in sync by triggers
+EVENT_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE event_fts USING fts5(
+        name, description, content='event', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER event_fts_insert AFTER INSERT ON event BEGIN
+        INSERT INTO event_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER event_fts_delete AFTER DELETE ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER event_fts_update AFTER UPDATE OF name, description ON event BEGIN
+        INSERT INTO event_fts(event_fts, rowid, name, description) VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO event_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+
+def upgrade():
+    op.create_table(
+        "eventoccurrence",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("start_date", sa.DateTime(), nullable=False),
+        sa.Column("end_date", sa.DateTime(), nullable=False),
+        sa.Column("event_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["event_id"],
+            ["event.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("eventoccurrence", schema=None) as batch_op:
+        batch_op.create_index("ix_eventoccurrence_event_id_start_date", ["event_id", "start_date"], unique=True)
+        batch_op.create_index("ix_eventoccurrence_start_date_id", ["start_date", "id"], unique=False)
+
+    # added columns do not create their enum type on PostgreSQL, unlike created tables
+    sa.Enum("weekly", name="eventrecurrence").create(op.get_bind(), checkfirst=True)
+    with op.batch_alter_table("event", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("recurrence", sa.Enum("weekly", name="eventrecurrence"), nullable=True))
+        batch_op.add_column(sa.Column("recurrence_until", sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column("participant_count", sa.Integer(), server_default="0", nullable=False))
+        batch_op.add_column(sa.Column("geo_cell", sa.Integer(), nullable=True))
+        batch_op.create_index("ix_event_geo_cell", ["geo_cell", "latitude", "longitude", "start_date"], unique=False)
+        batch_op.create_index("ix_event_recurrence", ["recurrence", "recurrence_until"], unique=False)
+        batch_op.create_index("ix_event_start_date_id", ["start_date", "id"], unique=False)
+        batch_op.create_index("ix_event_updated_at", ["updated_at"], unique=False)
+
+    # keep the first participation of each user in an event before the index becomes unique
+    op.execute(
+        "DELETE FROM eventuserlink WHERE id NOT IN (SELECT min(id) FROM eventuserlink GROUP BY event_id, user_id)"
+    )
+    with op.batch_alter_table("eventuserlink", schema=None) as batch_op:
+        batch_op.create_index("ix_eventuserlink_event_id_user_id", ["event_id", "user_id"], unique=True)
+
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.create_index("ix_user_email", ["email"], unique=True)
+
+    # existing events are all one-off events, each has exactly one occurrence
+    op.execute(
+        "INSERT INTO eventoccurrence (event_id, start_date, end_date) SELECT id, start_date, end_date FROM event"
+    )
+    # counted from the links left after the duplicates were removed
+    op.execute(
+        "UPDATE event SET participant_count = "
+        "(SELECT count(*) FROM eventuserlink WHERE eventuserlink.event_id = event.id)"
+    )
+    connection = op.get_bind()
+    cells = [
+        {"id": id, "geo_cell": grid_cell(latitude, longitude)}
+        for id, latitude, longitude in connection.execute(sa.text("SELECT id, latitude, longitude FROM event"))
+    ]
+    if cells:
+        connection.execute(sa.text("UPDATE event SET geo_cell = :geo_cell WHERE id = :id"), cells)
+
+    if connection.dialect.name == "sqlite":
+        for ddl in EVENT_FTS_DDL:
+            op.execute(ddl)
+        op.execute("INSERT INTO event_fts(event_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        for name in ["event_fts_update", "event_fts_delete", "event_fts_insert"]:
+            op.execute(f"DROP TRIGGER {name}")
+        op.execute("DROP TABLE event_fts")
+
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.drop_index("ix_user_email")
+
+    with op.batch_alter_table("eventuserlink", schema=None) as batch_op:
+        batch_op.drop_index("ix_eventuserlink_event_id_user_id")
+
+    with op.batch_alter_table("event", schema=None) as batch_op:
+        batch_op.drop_index("ix_event_updated_at")
+        batch_op.drop_index("ix_event_start_date_id")
+        batch_op.drop_index("ix_event_recurrence")
+        batch_op.drop_index("ix_event_geo_cell")
+        batch_op.drop_column("geo_cell")
+        batch_op.drop_column("participant_count")
+        batch_op.drop_column("recurrence_until")
+        batch_op.drop_column("recurrence")
+    sa.Enum(name="eventrecurrence").drop(op.get_bind(), checkfirst=True)
+
+    with op.batch_alter_table("eventoccurrence", schema=None) as batch_op:
+        batch_op.drop_index("ix_eventoccurrence_start_date_id")
+        batch_op.drop_index("ix_eventoccurrence_event_id_start_date")
+
+    op.drop_table("eventoccurrence")
@@ -0,0 +1,78 @@
+"""
+Indexes on the foreign keys of the link tables and on the lookup columns, the health data table
+(its model was never imported, so create_all did not create it)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:38:09.425675
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "userhealthdata",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("data_type", sa.Enum("steps", "distance", "calories", name="healthdatatype"), nullable=False),
+        sa.Column("data", sa.Integer(), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("userhealthdata", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_userhealthdata_user_id_data_type_date", ["user_id", "data_type", "date"], unique=False
+        )
+
+    with op.batch_alter_table("eventtaglink", schema=None) as batch_op:
+        batch_op.create_index("ix_eventtaglink_event_id_tag_id", ["event_id", "tag_id"], unique=False)
+        batch_op.create_index("ix_eventtaglink_tag_id_event_id", ["tag_id", "event_id"], unique=False)
+
+    with op.batch_alter_table("eventuserlink", schema=None) as batch_op:
+        batch_op.create_index("ix_eventuserlink_user_id_event_id", ["user_id", "event_id"], unique=False)
+
+    with op.batch_alter_table("tag", schema=None) as batch_op:
+        batch_op.create_index("ix_tag_name", ["name"], unique=False)
+
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.create_index("ix_user_level", ["level"], unique=False)
+
+    with op.batch_alter_table("usertaglink", schema=None) as batch_op:
+        batch_op.create_index("ix_usertaglink_tag_id_user_id", ["tag_id", "user_id"], unique=False)
+        batch_op.create_index("ix_usertaglink_user_id_tag_id", ["user_id", "tag_id"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("usertaglink", schema=None) as batch_op:
+        batch_op.drop_index("ix_usertaglink_user_id_tag_id")
+        batch_op.drop_index("ix_usertaglink_tag_id_user_id")
+
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.drop_index("ix_user_level")
+
+    with op.batch_alter_table("tag", schema=None) as batch_op:
+        batch_op.drop_index("ix_tag_name")
+
+    with op.batch_alter_table("eventuserlink", schema=None) as batch_op:
+        batch_op.drop_index("ix_eventuserlink_user_id_event_id")
+
+    with op.batch_alter_table("eventtaglink", schema=None) as batch_op:
+        batch_op.drop_index("ix_eventtaglink_tag_id_event_id")
+        batch_op.drop_index("ix_eventtaglink_event_id_tag_id")
+
+    with op.batch_alter_table("userhealthdata", schema=None) as batch_op:
+        batch_op.drop_index("ix_userhealthdata_user_id_data_type_date")
+
+    op.drop_table("userhealthdata")
+    sa.Enum(name="healthdatatype").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,139 @@
+"""
+Materialized leaderboards per scope with bucket counts, user birthday index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 13:14:55.995459
+"""
+
+from datetime import date, datetime, time, timedelta
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+# the tables and rules of this revision, frozen so the migration does not change with the application helpers
+LEVEL_BUCKETS = 100
+AGE_BAND_STARTS = [(60, "60-plus"), (50, "50-59"), (40, "40-49"), (30, "30-39"), (18, "18-29")]
+
+user = sa.table("user", sa.column("id", sa.Integer), sa.column("level", sa.Float), sa.column("birthday", sa.DateTime))
+user_tag_link = sa.table("usertaglink", sa.column("user_id", sa.Integer), sa.column("tag_id", sa.Integer))
+leaderboard_entry = sa.table(
+    "leaderboardentry",
+    sa.column("scope", sa.String),
+    sa.column("bucket", sa.Integer),
+    sa.column("level", sa.Float),
+    sa.column("user_id", sa.Integer),
+)
+leaderboard_bucket = sa.table(
+    "leaderboardbucket",
+    sa.column("scope", sa.String),
+    sa.column("bucket", sa.Integer),
+    sa.column("user_count", sa.Integer),
+)
+
+
+def _years_before(day: date, years: int) -> date:
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # 29th of February
+        return day.replace(year=day.year - years, day=28)
+
+
+def fill_leaderboards(connection: sa.engine.Connection):
+    """
+    Materialize the leaderboards of all users, like leaderboard_helper.rebuild_leaderboard at this revision
+    """
+    today = date.today()
+    # a user is in the band of the first start age the birthday is not after
+    band = sa.case(
+        *(
+            (user.c.birthday < datetime.combine(_years_before(today, start) + timedelta(days=1), time()), name)
+            for start, name in AGE_BAND_STARTS
+        ),
+        else_="under-18",
+    )
+    # levels are not negative, so truncating like SQLite's cast does is the same as floor
+    if connection.dialect.name == "postgresql":
+        bucket = sa.cast(sa.func.floor(user.c.level * LEVEL_BUCKETS), sa.Integer)
+    else:
+        bucket = sa.cast(user.c.level * LEVEL_BUCKETS, sa.Integer)
+    tag_scope = sa.literal("tag:") + sa.cast(user_tag_link.c.tag_id, sa.String)
+    joined = user.join(user_tag_link, user_tag_link.c.user_id == user.c.id)
+    scopes = [
+        sa.select(sa.literal("all"), bucket, user.c.level, user.c.id),
+        sa.select(sa.literal("age:") + band, bucket, user.c.level, user.c.id).where(user.c.birthday.is_not(None)),
+        sa.select(tag_scope, bucket, user.c.level, user.c.id).select_from(joined).distinct(),
+        sa.select(tag_scope + sa.literal(":age:") + band, bucket, user.c.level, user.c.id)
+        .select_from(joined)
+        .where(user.c.birthday.is_not(None))
+        .distinct(),
+    ]
+    for scope in scopes:
+        connection.execute(sa.insert(leaderboard_entry).from_select(["scope", "bucket", "level", "user_id"], scope))
+    connection.execute(
+        sa.insert(leaderboard_bucket).from_select(
+            ["scope", "bucket", "user_count"],
+            sa.select(leaderboard_entry.c.scope, leaderboard_entry.c.bucket, sa.func.count()).group_by(
+                leaderboard_entry.c.scope, leaderboard_entry.c.bucket
+            ),
+        )
+    )
+
+
+def upgrade():
+    op.create_table(
+        "leaderboardbucket",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("scope", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("bucket", sa.Integer(), nullable=False),
+        sa.Column("user_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("leaderboardbucket", schema=None) as batch_op:
+        batch_op.create_index("ix_leaderboardbucket_scope_bucket", ["scope", "bucket"], unique=True)
+
+    op.create_table(
+        "leaderboardentry",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("scope", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.Column("bucket", sa.Integer(), nullable=False),
+        sa.Column("level", sa.Float(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("leaderboardentry", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_leaderboardentry_scope_bucket_level_user_id", ["scope", "bucket", "level", "user_id"], unique=True
+        )
+        batch_op.create_index("ix_leaderboardentry_user_id_scope", ["user_id", "scope"], unique=True)
+
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.create_index("ix_user_birthday", ["birthday"], unique=False)
+
+    # age bands are computed as of today, the leaderboard job moves users on their birthdays afterwards
+    fill_leaderboards(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table("user", schema=None) as batch_op:
+        batch_op.drop_index("ix_user_birthday")
+
+    with op.batch_alter_table("leaderboardentry", schema=None) as batch_op:
+        batch_op.drop_index("ix_leaderboardentry_user_id_scope")
+        batch_op.drop_index("ix_leaderboardentry_scope_bucket_level_user_id")
+
+    op.drop_table("leaderboardentry")
+    with op.batch_alter_table("leaderboardbucket", schema=None) as batch_op:
+        batch_op.drop_index("ix_leaderboardbucket_scope_bucket")
+
+    op.drop_table("leaderboardbucket")
@@ -0,0 +1,112 @@
+"""
+Hourly and daily health data rollups, unique health data samples
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 13:21:01.958426
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# the type already exists since 0003, on PostgreSQL it must not be created again
+health_data_type = sa.Enum("steps", "distance", "calories", name="healthdatatype").with_variant(
+    postgresql.ENUM("steps", "distance", "calories", name="healthdatatype", create_type=False), "postgresql"
+)
+
+# rollup table of each period with the format SQLite stores its start in, frozen like the rest of this revision
+ROLLUP_SQLITE_FORMATS = {
+    "userhealthhourly": ("hour", "%Y-%m-%d %H:00:00.000000"),
+    "userhealthdaily": ("day", "%Y-%m-%d 00:00:00.000000"),
+}
+
+health_data = sa.table(
+    "userhealthdata",
+    sa.column("user_id", sa.Integer),
+    sa.column("data_type", health_data_type),
+    sa.column("date", sa.DateTime),
+    sa.column("data", sa.Integer),
+)
+
+
+def fill_health_rollups(connection: sa.engine.Connection):
+    """
+    Aggregate the hourly and daily rollups of all samples, like health_data_helper.rebuild_health_rollups
+    at this revision
+    """
+    for table, (period, sqlite_format) in ROLLUP_SQLITE_FORMATS.items():
+        if connection.dialect.name == "postgresql":
+            start = sa.func.date_trunc(period, health_data.c.date)
+        else:
+            start = sa.func.strftime(sqlite_format, health_data.c.date)
+        rollup = sa.table(
+            table,
+            sa.column("user_id", sa.Integer),
+            sa.column("data_type", health_data_type),
+            sa.column("start", sa.DateTime),
+            sa.column("total", sa.Integer),
+            sa.column("sample_count", sa.Integer),
+        )
+        connection.execute(
+            sa.insert(rollup).from_select(
+                ["user_id", "data_type", "start", "total", "sample_count"],
+                sa.select(
+                    health_data.c.user_id,
+                    health_data.c.data_type,
+                    start,
+                    sa.func.sum(health_data.c.data),
+                    sa.func.count(),
+                ).group_by(health_data.c.user_id, health_data.c.data_type, start),
+            )
+        )
+
+
+def upgrade():
+    for table in ("userhealthdaily", "userhealthhourly"):
+        op.create_table(
+            table,
+            sa.Column("data_type", health_data_type, nullable=False),
+            sa.Column("start", sa.DateTime(), nullable=False),
+            sa.Column("total", sa.Integer(), nullable=False),
+            sa.Column("sample_count", sa.Integer(), nullable=False),
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(
+                ["user_id"],
+                ["user.id"],
+            ),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(f"ix_{table}_user_id_data_type_start", ["user_id", "data_type", "start"], unique=True)
+
+    # keep the latest sample of each user, type and date before the index becomes unique
+    op.execute(
+        "DELETE FROM userhealthdata WHERE id NOT IN "
+        "(SELECT max(id) FROM userhealthdata GROUP BY user_id, data_type, date)"
+    )
+    with op.batch_alter_table("userhealthdata", schema=None) as batch_op:
+        batch_op.drop_index("ix_userhealthdata_user_id_data_type_date")
+        batch_op.create_index("ix_userhealthdata_user_id_data_type_date", ["user_id", "data_type", "date"], unique=True)
+
+    fill_health_rollups(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table("userhealthdata", schema=None) as batch_op:
+        batch_op.drop_index("ix_userhealthdata_user_id_data_type_date")
+        batch_op.create_index(
+            "ix_userhealthdata_user_id_data_type_date", ["user_id", "data_type", "date"], unique=False
+        )
+
+    for table in ("userhealthhourly", "userhealthdaily"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f"ix_{table}_user_id_data_type_start")
+
+        op.drop_table(table)
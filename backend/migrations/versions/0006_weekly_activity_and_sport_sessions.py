@@ -0,0 +1,138 @@
+"""
+Weekly active minutes per user and suggested sport sessions
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 13:28:10.834675
+"""
+
+from datetime import date, datetime, time, timedelta
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+# the rules of this revision, frozen so the migration does not change with activity_helper and the settings
+STEPS_PER_ACTIVE_MINUTE = 100
+MAX_EVENT_MINUTES = 180
+RETENTION_WEEKS = 8
+SQLITE_WEEK_FORMAT = "%Y-%m-%d 00:00:00.000000"
+
+user = sa.table("user", sa.column("id", sa.Integer))
+health_daily = sa.table(
+    "userhealthdaily",
+    sa.column("user_id", sa.Integer),
+    sa.column("data_type", sa.Enum("steps", "distance", "calories", name="healthdatatype")),
+    sa.column("start", sa.DateTime),
+    sa.column("total", sa.Integer),
+)
+event_user_link = sa.table("eventuserlink", sa.column("event_id", sa.Integer), sa.column("user_id", sa.Integer))
+event_occurrence = sa.table(
+    "eventoccurrence",
+    sa.column("event_id", sa.Integer),
+    sa.column("start_date", sa.DateTime),
+    sa.column("end_date", sa.DateTime),
+)
+weekly_activity = sa.table(
+    "userweeklyactivity",
+    sa.column("user_id", sa.Integer),
+    sa.column("week", sa.DateTime),
+    sa.column("minutes", sa.Float),
+)
+
+
+def fill_weekly_activity(connection: sa.engine.Connection):
+    """
+    Accumulate the weekly activity of all users within the retention, like activity_helper.rebuild_weekly_activity
+    at this revision. Every user gets an accumulator for the current week.
+    """
+    today = datetime.combine(date.today(), time())
+    week = today - timedelta(days=today.weekday())
+    first_week = week - timedelta(weeks=RETENTION_WEEKS)
+    duration = event_occurrence.c.end_date - event_occurrence.c.start_date
+    if connection.dialect.name == "postgresql":
+        sample_week = sa.func.date_trunc("week", health_daily.c.start)
+        occurrence_week = sa.func.date_trunc("week", event_occurrence.c.start_date)
+        event_minutes = sa.func.least(sa.extract("epoch", duration) / 60, MAX_EVENT_MINUTES)
+    else:
+        # the Sunday ending the week minus six days
+        sample_week = sa.func.strftime(SQLITE_WEEK_FORMAT, health_daily.c.start, "weekday 0", "-6 days")
+        occurrence_week = sa.func.strftime(SQLITE_WEEK_FORMAT, event_occurrence.c.start_date, "weekday 0", "-6 days")
+        seconds = sa.func.round(
+            (sa.func.julianday(event_occurrence.c.end_date) - sa.func.julianday(event_occurrence.c.start_date)) * 86400
+        )
+        event_minutes = sa.func.min(seconds / 60, MAX_EVENT_MINUTES)
+
+    minutes = sa.union_all(
+        sa.select(
+            health_daily.c.user_id,
+            sample_week.label("week"),
+            (health_daily.c.total / float(STEPS_PER_ACTIVE_MINUTE)).label("minutes"),
+        ).where(health_daily.c.data_type == "steps", health_daily.c.start >= first_week),
+        sa.select(event_user_link.c.user_id, occurrence_week, event_minutes)
+        .select_from(event_user_link.join(event_occurrence, event_occurrence.c.event_id == event_user_link.c.event_id))
+        .where(event_occurrence.c.start_date >= first_week),
+        sa.select(user.c.id, sa.literal(week), sa.literal(0.0)),
+    ).subquery()
+    connection.execute(
+        sa.insert(weekly_activity).from_select(
+            ["user_id", "week", "minutes"],
+            sa.select(minutes.c.user_id, minutes.c.week, sa.func.sum(minutes.c.minutes)).group_by(
+                minutes.c.user_id, minutes.c.week
+            ),
+        )
+    )
+
+
+def upgrade():
+    op.create_table(
+        "sportsession",
+        sa.Column("start_date", sa.DateTime(), nullable=False),
+        sa.Column("end_date", sa.DateTime(), nullable=False),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("sportsession", schema=None) as batch_op:
+        batch_op.create_index("ix_sportsession_user_id_start_date", ["user_id", "start_date"], unique=True)
+
+    op.create_table(
+        "userweeklyactivity",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("week", sa.DateTime(), nullable=False),
+        sa.Column("minutes", sa.Float(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["user.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    with op.batch_alter_table("userweeklyactivity", schema=None) as batch_op:
+        batch_op.create_index("ix_userweeklyactivity_user_id_week", ["user_id", "week"], unique=True)
+        batch_op.create_index(
+            "ix_userweeklyactivity_week_minutes_user_id", ["week", "minutes", "user_id"], unique=False
+        )
+
+    # every existing user gets an accumulator for the current week
+    fill_weekly_activity(op.get_bind())
+
+
+def downgrade():
+    with op.batch_alter_table("userweeklyactivity", schema=None) as batch_op:
+        batch_op.drop_index("ix_userweeklyactivity_week_minutes_user_id")
+        batch_op.drop_index("ix_userweeklyactivity_user_id_week")
+
+    op.drop_table("userweeklyactivity")
+    with op.batch_alter_table("sportsession", schema=None) as batch_op:
+        batch_op.drop_index("ix_sportsession_user_id_start_date")
+
+    op.drop_table("sportsession")
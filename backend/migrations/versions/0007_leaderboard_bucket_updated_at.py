@@ -0,0 +1,34 @@
+"""
+Last change of each leaderboard bucket, the validator of leaderboard pages
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 15:02:41.518203
+"""
+
+from datetime import datetime
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("leaderboardbucket", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("updated_at", sa.DateTime(), nullable=True))
+
+    # the existing buckets count as changed now, so cached leaderboard pages are validated again
+    leaderboard_bucket = sa.table("leaderboardbucket", sa.column("updated_at", sa.DateTime))
+    op.execute(sa.update(leaderboard_bucket).values(updated_at=datetime.now()))
+
+    with op.batch_alter_table("leaderboardbucket", schema=None) as batch_op:
+        batch_op.alter_column("updated_at", existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table("leaderboardbucket", schema=None) as batch_op:
+        batch_op.drop_column("updated_at")
@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+import logging
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.database import engine, read_engine
+from app.leaderboard_helper import register_flush_listener
+from app.migration_helper import upgrade_database
+from app.mock_data_helper import setup_mock_data
+
+
+async def seed(mock_data: bool = True):
+    """
+    Migrate the database to the latest revision and insert the mock data when there are no users yet
+    """
+    try:
+        logging.info("migrating database")
+        await upgrade_database()
+
+        if mock_data:
+            # the mock users are ranked when they are flushed
+            register_flush_listener()
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                await setup_mock_data(session)
+    finally:
+        await engine.dispose()
+        await read_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Prepare the database before starting the API")
+    parser.add_argument("--no-mock-data", action="store_true", help="only migrate the schema")
+    args = parser.parse_args()
+    asyncio.run(seed(mock_data=not args.no_mock_data))
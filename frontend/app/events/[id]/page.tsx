@@ -39,7 +39,8 @@ interface Attendee {
 interface EventApiResponse {
   event: Event
   tags: Tag[]
-  attendees: Attendee[]
+  attendees: Attendee[] // first attendees only, see attendee_count
+  attendee_count: number
 }
 
 export default function EventInfoPage() {
@@ -89,7 +90,7 @@ export default function EventInfoPage() {
     )
   }
 
-  const { event, tags, attendees } = data
+  const { event, tags, attendees, attendee_count } = data
 
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleDateString("en-EN", {
@@ -148,7 +149,7 @@ export default function EventInfoPage() {
                 <UserCheck className="w-5 h-5 text-blue-600" />
                 <div>
                   <p className="text-sm text-gray-600">Attendees</p>
-                  <p className="font-semibold text-gray-900">{attendees.length}</p>
+                  <p className="font-semibold text-gray-900">{attendee_count}</p>
                 </div>
               </div>
             </div>
@@ -256,7 +257,10 @@ export default function EventInfoPage() {
             <CardHeader>
               <CardTitle className="text-xl font-bold text-gray-900 flex items-center gap-2">
                 <Users className="w-5 h-5 text-green-600" />
-                Attendees ({attendees.length})
+                Attendees ({attendee_count})
+                {attendees.length < attendee_count && (
+                  <span className="text-sm font-normal text-gray-500">showing the first {attendees.length}</span>
+                )}
               </CardTitle>
             </CardHeader>
             <CardContent>
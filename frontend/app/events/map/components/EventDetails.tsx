@@ -43,13 +43,15 @@ interface ParticipationResponse {
   score: number;
   event_id: number;
   user_id: number;
+  conflicting_event_ids: number[];
 }
 
 interface EventApiResponse {
   event: Event;
   tags: Tag[];
   is_participating: boolean;
-  attendees: Attendee[];
+  attendees: Attendee[]; // first attendees only, see attendee_count
+  attendee_count: number;
 }
 
 interface EventDetailOverlayProps {
@@ -155,7 +157,7 @@ export default function EventDetails({ eventId, onClose, onAdd }: EventDetailOve
     );
   }
 
-  const { event, tags, attendees } = data;
+  const { event, tags, attendees, attendee_count } = data;
 
   const formatDate = (dateString: string) => {
     return new Date(dateString).toLocaleDateString("en-EN", {
@@ -219,7 +221,7 @@ export default function EventDetails({ eventId, onClose, onAdd }: EventDetailOve
                 <UserCheck className="w-5 h-5 text-blue-600" />
                 <div>
                   <p className="text-sm text-gray-600">Attendees</p>
-                  <p className="font-semibold text-gray-900">{attendees.length}</p>
+                  <p className="font-semibold text-gray-900">{attendee_count}</p>
                 </div>
               </div>
             </div>
@@ -326,7 +328,10 @@ export default function EventDetails({ eventId, onClose, onAdd }: EventDetailOve
             <CardHeader>
               <CardTitle className="text-xl font-bold text-gray-900 flex items-center gap-2">
                 <Users className="w-5 h-5 text-green-600" />
-                Attendees ({attendees.length})
+                Attendees ({attendee_count})
+                {attendees.length < attendee_count && (
+                  <span className="text-sm font-normal text-gray-500">showing the first {attendees.length}</span>
+                )}
               </CardTitle>
             </CardHeader>
             <CardContent>